@@ -1,25 +1,177 @@
 #!/usr/bin/env python
 
 import base64
+import gzip
+import hashlib
 import json
+import math
 
 from os.path import join as pjoin
 from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 
 import grpc
 
 from pathlib import Path
-from flask import Flask, render_template, request
+from flask import (
+    Flask, Response, make_response, render_template, request,
+    send_from_directory
+)
 from flask_cors import CORS
-from flask_json import FlaskJSON, JsonError, as_json
-
-from trillian_client import TrillianLogClient, TrillianAdminClient
+from flask_json import FlaskJSON, JsonError, as_json, json_response
+
+from backend_pool import BackendPool, HedgingPolicy
+from bloom import LeafBlooms
+from cache import LRUCache
+from frontier import LogFrontiers
+from hash_store import LeafHashStores
+from idempotency import (
+    IdempotencyStore, KeyReused, RequestInFlight, StoredResponse
+)
+from log_root import LogRootVerifier
+from mirror import LeafMirror
+from overload import BackendGuard, BackendOverloaded
+from rate_limit import RateLimiter
+from root_history import RootHistory
+from tiles import TileWriter
+from trillian_client import (
+    TrillianLogClient, TrillianAdminClient, leaf_identity_hash
+)
 
 import crypto.sigpb.sigpb_pb2
+import merkle
 
 
 HOME_DIR = str(Path.home())
 
+# Addresses of the trillian_log_server replicas to spread requests across, and
+# how to choose between them: 'round_robin' or 'least_outstanding'.
+TRILLIAN_BACKENDS = ['localhost:8090']
+TRILLIAN_BALANCING_POLICY = 'round_robin'
+
+# A backend which fails this many requests in a row is taken out of rotation
+# for TRILLIAN_BACKEND_EJECTION_SECONDS.
+TRILLIAN_BACKEND_MAX_FAILURES = 3
+TRILLIAN_BACKEND_EJECTION_SECONDS = 30
+
+# When enabled, a read that's slower than TRILLIAN_HEDGE_PERCENTILE of recent
+# reads is also sent to a second backend. At most TRILLIAN_HEDGE_MAX_RATE of
+# reads are ever duplicated.
+TRILLIAN_HEDGE_READS = False
+TRILLIAN_HEDGE_PERCENTILE = 95
+TRILLIAN_HEDGE_MAX_RATE = 0.05
+
+# Every RPC to Trillian is given this long before it's abandoned.
+TRILLIAN_RPC_TIMEOUT_SECONDS = 10
+
+# At most this many RPCs may be in flight to Trillian at once; beyond that,
+# requests which need the backend get a 503 straight away.
+TRILLIAN_MAX_IN_FLIGHT = 32
+
+# After this many consecutive timeouts or UNAVAILABLE errors for one class of
+# RPC (reads, writes, admin), calls of that class are refused for
+# TRILLIAN_CIRCUIT_RESET_SECONDS before a single trial call is let through.
+TRILLIAN_CIRCUIT_MAX_FAILURES = 5
+TRILLIAN_CIRCUIT_RESET_SECONDS = 10
+
+# Token-bucket limits for each route, given as (requests per second, burst).
+# 'per_client' buckets are kept for each client and log, where clients are told
+# apart by their X-API-Key header if it's one of API_KEYS, or else their IP
+# address. 'per_log' buckets are shared by every client of a log.
+RATE_LIMITS = {
+    'insert_single_log_entry': {
+        'per_client': (5, 20),
+        'per_log': (50, 100),
+    },
+    'get_leaves_by_range': {
+        'per_client': (20, 40),
+        'per_log': (200, 400),
+    },
+    'get_leaf_hashes_by_range': {
+        'per_client': (20, 40),
+        'per_log': (200, 400),
+    },
+    'get_batch_inclusion_proofs': {
+        'per_client': (2, 5),
+        'per_log': (20, 40),
+    },
+    'get_consistency_proof_chain': {
+        'per_client': (2, 5),
+        'per_log': (20, 40),
+    },
+}
+
+# The X-API-Key headers which identify clients. Any other key is ignored, so a
+# client can't escape its limits by sending a new key with every request.
+API_KEYS = []
+
+# How many proofs to keep in memory. A proof for a given leaf and tree size
+# never changes, so there's no expiry.
+PROOF_CACHE_SIZE = 100000
+
+# Batch requests fan out to at most this many concurrent RPCs, and may ask for
+# at most MAX_BATCH_SIZE proofs.
+BATCH_CONCURRENCY = 8
+MAX_BATCH_SIZE = 4096
+
+# Threads used to hash large pages of leaves when verifying them.
+LEAF_HASH_WORKERS = 4
+
+# Check the signature on every signed log root from Trillian against the log's
+# public key before caching or serving it.
+VERIFY_LOG_ROOTS = True
+
+# Where to keep the history of every signed log root we've seen. Set to None to
+# turn off the history.
+ROOT_HISTORY_DIR = pjoin(HOME_DIR, '.trillian', 'root_history')
+
+# Set to a directory to keep a local copy of every log's sequenced leaves,
+# checked for new leaves every MIRROR_POLL_SECONDS. Reads of leaves which have
+# been mirrored are then served without asking Trillian. The mirror also keeps
+# the log's Merkle tree, so proofs within the mirrored size are computed
+# locally, and checks every root hash Trillian publishes against the leaves.
+MIRROR_DIR = None
+MIRROR_POLL_SECONDS = 10
+
+# Set to a directory, as well as MIRROR_DIR, to write every log's leaves out as
+# static tiles which never change once written. They're served under
+# /v1beta1/logs/<log_id>/tile/, or TILE_DIR can be served by any file server.
+TILE_DIR = None
+
+# The mirror keeps a Bloom filter of each log's leaf hashes, so lookups of
+# leaves which aren't in the log can usually be answered straight away. This
+# is the most it should wrongly say might be in the log.
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+# Leaves are also served in pages aligned to multiples of LEAF_PAGE_SIZE, which
+# must be no more than Trillian returns in one request (1024). Full pages never
+# change, so up to LEAF_PAGE_CACHE_SIZE of them, taking at most
+# LEAF_PAGE_CACHE_BYTES, are kept ready to send, and shared caches may keep
+# them forever. The last page is still filling up, so it's only cached for
+# PARTIAL_LEAF_PAGE_MAX_AGE seconds.
+LEAF_PAGE_SIZE = 256
+LEAF_PAGE_CACHE_SIZE = 10000
+LEAF_PAGE_CACHE_BYTES = 64 * 1024 * 1024
+PARTIAL_LEAF_PAGE_MAX_AGE = 5
+
+# Producers often retry submissions, so the response to the last
+# RECENT_SUBMISSIONS_PER_LOG entries submitted to each log is kept, and
+# resubmitting the same value gets the same response without going to
+# Trillian.
+RECENT_SUBMISSIONS_PER_LOG = 10000
+
+# Clients can send an Idempotency-Key header when submitting entries. Retrying
+# with the same key within IDEMPOTENCY_KEY_EXPIRY_SECONDS gets the original
+# response back. Up to IDEMPOTENCY_MAX_KEYS responses are kept in memory; set
+# IDEMPOTENCY_DB to an SQLite file to keep them across restarts too.
+IDEMPOTENCY_KEY_EXPIRY_SECONDS = 24 * 60 * 60
+IDEMPOTENCY_MAX_KEYS = 100000
+IDEMPOTENCY_DB = None
+
+# The most leaf hashes returned by one leaves:hashes request.
+MAX_LEAF_HASH_RANGE = 65536
+
 app = Flask(__name__)
 FlaskJSON(app)
 app.config['JSON_ADD_STATUS'] = False
@@ -33,11 +185,15 @@ CORS(app)
 
 
 class SignedLogRootSerializer():
-    def __init__(self, signed_log_root):
+    def __init__(self, signed_log_root, log_root=None):
+        """
+        If the decoded `log_root` is given, its fields are included too.
+        """
         self.__slr = signed_log_root
+        self.__log_root = log_root
 
     def json(self):
-        return OrderedDict([
+        serialized = OrderedDict([
             ('_timestamp_nanos', self.__slr.timestamp_nanos),
             ('_root_hash', to_b64(self.__slr.root_hash)),
             ('_tree_size', self.__slr.tree_size),
@@ -47,12 +203,328 @@ class SignedLogRootSerializer():
             ('log_root_signature', to_b64(self.__slr.log_root_signature)),
         ])
 
+        if self.__log_root is not None:
+            serialized['log_root_v1'] = OrderedDict([
+                ('version', self.__log_root.version),
+                ('tree_size', self.__log_root.tree_size),
+                ('root_hash', to_b64(self.__log_root.root_hash)),
+                ('timestamp_nanos', self.__log_root.timestamp_nanos),
+                ('revision', self.__log_root.revision),
+                ('metadata', to_b64(self.__log_root.metadata)),
+            ])
+
+        return serialized
+
+
+BACKEND_POOL = BackendPool(
+    app.config['TRILLIAN_BACKENDS'],
+    policy=app.config['TRILLIAN_BALANCING_POLICY'],
+    max_failures=app.config['TRILLIAN_BACKEND_MAX_FAILURES'],
+    ejection_seconds=app.config['TRILLIAN_BACKEND_EJECTION_SECONDS'],
+    hedging=HedgingPolicy(
+        percentile=app.config['TRILLIAN_HEDGE_PERCENTILE'],
+        max_rate=app.config['TRILLIAN_HEDGE_MAX_RATE'],
+    ) if app.config['TRILLIAN_HEDGE_READS'] else None,
+    guard=BackendGuard(
+        max_in_flight=app.config['TRILLIAN_MAX_IN_FLIGHT'],
+        max_failures=app.config['TRILLIAN_CIRCUIT_MAX_FAILURES'],
+        reset_seconds=app.config['TRILLIAN_CIRCUIT_RESET_SECONDS'],
+    ),
+    timeout=app.config['TRILLIAN_RPC_TIMEOUT_SECONDS'],
+)
+
+
+TRUSTED_API_KEYS = frozenset(app.config['API_KEYS'])
+
+RATE_LIMITERS = {
+    endpoint: {
+        scope: RateLimiter(rate, burst)
+        for scope, (rate, burst) in limits.items()
+    } for endpoint, limits in app.config['RATE_LIMITS'].items()
+}
+
+
+def client_id():
+    """
+    Identifies who's making the current request, by its API key if it's one
+    of API_KEYS, otherwise by its IP address. API keys are hashed so that
+    they don't end up in Trillian's quota configuration or logs.
+    """
+    api_key = request.headers.get('X-API-Key')
+
+    if api_key in TRUSTED_API_KEYS:
+        return 'key:{}'.format(
+            hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+        )
+
+    return 'ip:{}'.format(request.remote_addr)
+
+
+PROOF_CACHE = LRUCache(app.config['PROOF_CACHE_SIZE'])
+
+IDEMPOTENCY_STORE = IdempotencyStore(
+    expiry_seconds=app.config['IDEMPOTENCY_KEY_EXPIRY_SECONDS'],
+    max_entries=app.config['IDEMPOTENCY_MAX_KEYS'],
+    path=app.config['IDEMPOTENCY_DB'],
+)
+
+# log_id: LRUCache of leaf identity hash: response to that submission
+RECENT_SUBMISSIONS = LRUCache(1000)
+
+# Values are (JSON body, gzipped JSON body)
+LEAF_PAGE_CACHE = LRUCache(
+    app.config['LEAF_PAGE_CACHE_SIZE'],
+    max_bytes=app.config['LEAF_PAGE_CACHE_BYTES'],
+    size_of=lambda bodies: sum(map(len, bodies)),
+)
+
+BATCH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=app.config['BATCH_CONCURRENCY']
+)
+
+HASH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=app.config['LEAF_HASH_WORKERS']
+)
+
 
 def make_log_client(log_id):
-    return TrillianLogClient('localhost', '8090', log_id)
+    return TrillianLogClient(BACKEND_POOL, log_id, charge_to=[client_id()])
+
+
+def rate_limited(view):
+    """
+    Applies the RATE_LIMITS configured for the view's endpoint, if any.
+    """
+    @wraps(view)
+    def wrapper(log_id, *args, **kwargs):
+        keys = {
+            'per_client': (client_id(), log_id),
+            'per_log': log_id,
+        }
+        buckets = [
+            (limiter, keys[scope]) for scope, limiter in
+            RATE_LIMITERS.get(request.endpoint, {}).items()
+        ]
+
+        # Every bucket is checked before any tokens are taken, so a request
+        # turned away by one bucket doesn't use up the others.
+        retry_after = max(
+            [limiter.available(key) for limiter, key in buckets] or [0]
+        )
+
+        if not retry_after:
+            retry_after = take_tokens(buckets)
+
+        if retry_after:
+            raise JsonError(
+                status_=429,
+                headers_={'Retry-After': str(int(math.ceil(retry_after)))},
+                description='Rate limit exceeded, try again later'
+            )
+
+        return view(log_id, *args, **kwargs)
+
+    return wrapper
+
+
+def take_tokens(buckets):
+    """
+    Takes a token from each of a list of (RateLimiter, key). If one has run
+    out since it was checked, the tokens already taken are put back and the
+    seconds until it refills are returned. Otherwise returns 0.
+    """
+    taken = []
+
+    for limiter, key in buckets:
+        retry_after = limiter.acquire(key)
+
+        if retry_after:
+            for taken_limiter, taken_key in taken:
+                taken_limiter.refund(taken_key)
+
+            return retry_after
+
+        taken.append((limiter, key))
+
+    return 0
+
+
+def idempotent(view):
+    """
+    Handles the Idempotency-Key header: the first request with a key is
+    carried out and its response stored, and repeats get the stored response
+    without the view running again. Responses with a 5xx status, or errors,
+    aren't stored, so the request can be retried.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+
+        if idempotency_key is None:
+            return view(*args, **kwargs)
+
+        if not 0 < len(idempotency_key) <= 255:
+            raise JsonError(
+                status=400,
+                description='Idempotency-Key must be 1 to 255 characters'
+            )
+
+        key = json.dumps([client_id(), request.path, idempotency_key])
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        try:
+            stored = IDEMPOTENCY_STORE.begin(key, fingerprint)
+        except RequestInFlight:
+            raise JsonError(
+                status_=409, status=409, headers_={'Retry-After': '1'},
+                description='A request with this Idempotency-Key is still '
+                            'in progress'
+            )
+        except KeyReused:
+            raise JsonError(
+                status_=422, status=422,
+                description='This Idempotency-Key was used for a different '
+                            'request'
+            )
+
+        if stored is not None:
+            return Response(
+                stored.body, status=stored.status, mimetype=stored.mimetype,
+                headers={'Idempotent-Replayed': 'true'}
+            )
 
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            IDEMPOTENCY_STORE.finish(key, None)
+            raise
+
+        if response.status_code < 500:
+            IDEMPOTENCY_STORE.finish(key, StoredResponse(
+                response.status_code, response.mimetype, response.get_data()
+            ))
+        else:
+            IDEMPOTENCY_STORE.finish(key, None)
+
+        return response
+
+    return wrapper
+
+
+TRILLIAN_ADMIN = TrillianAdminClient(BACKEND_POOL)
+
+LOG_ROOT_VERIFIER = LogRootVerifier(
+    lambda log_id: TRILLIAN_ADMIN.get_log(log_id).public_key.der,
+    check_signatures=app.config['VERIFY_LOG_ROOTS'],
+)
+
+
+HASH_STORES = LeafHashStores(
+    pjoin(app.config['MIRROR_DIR'], 'hashes')
+) if app.config['MIRROR_DIR'] else None
+
+
+FRONTIERS = LogFrontiers(
+    pjoin(app.config['MIRROR_DIR'], 'frontiers')
+) if app.config['MIRROR_DIR'] else None
+
+
+LEAF_BLOOMS = LeafBlooms(
+    pjoin(app.config['MIRROR_DIR'], 'blooms'),
+    false_positive_rate=app.config['BLOOM_FALSE_POSITIVE_RATE'],
+) if app.config['MIRROR_DIR'] else None
+
+
+TILE_WRITER = TileWriter(
+    app.config['TILE_DIR']
+) if app.config['MIRROR_DIR'] and app.config['TILE_DIR'] else None
+
+
+ROOT_HISTORY = RootHistory(
+    app.config['ROOT_HISTORY_DIR']
+) if app.config['ROOT_HISTORY_DIR'] else None
+
+
+def check_root(log_id, signed_log_root):
+    """
+    Returns the decoded LogRootV1 of `signed_log_root` if its signature is
+    good and its root hash isn't known to disagree with the mirrored leaves,
+    and adds it to the root history. Otherwise raises ValueError.
+    """
+    log_root = LOG_ROOT_VERIFIER.verify(log_id, signed_log_root)
+
+    if FRONTIERS is not None and FRONTIERS.check(log_id, log_root) is False:
+        raise ValueError(
+            'Root hash of log {} at tree size {} does not match its '
+            'mirrored leaves'.format(log_id, log_root.tree_size)
+        )
+
+    if ROOT_HISTORY is not None:
+        ROOT_HISTORY.record(log_id, signed_log_root, log_root)
 
-TRILLIAN_ADMIN = TrillianAdminClient('localhost', '8090')
+    return log_root
+
+
+def verified(log_id, signed_log_root):
+    """
+    Returns the decoded LogRootV1 of `signed_log_root` if it passes
+    check_root. Otherwise raises a 502 rather than pass on a root the log
+    didn't sign, or one which doesn't match its leaves.
+    """
+    try:
+        return check_root(log_id, signed_log_root)
+    except ValueError as e:
+        app.logger.error(str(e))
+        raise JsonError(status_=502, status=502, description=str(e))
+
+
+def verified_covering(log_id, signed_log_root, tree_size):
+    """
+    Verifies the signed log root Trillian sent with a proof, and raises
+    ValueError if its tree is smaller than `tree_size`. Trillian doesn't
+    refuse tree sizes beyond the log, it answers for its current tree
+    instead, and that answer mustn't be cached as one for `tree_size`.
+    """
+    log_root = verified(log_id, signed_log_root)
+
+    if log_root.tree_size < tree_size:
+        raise ValueError(
+            'tree_size {} is beyond the tree size of the log, {}'.format(
+                tree_size, log_root.tree_size)
+        )
+
+    return log_root
+
+
+MIRROR = LeafMirror(
+    app.config['MIRROR_DIR'],
+    make_log_client=lambda log_id: TrillianLogClient(
+        BACKEND_POOL, log_id, charge_to=['mirror']
+    ),
+    list_log_ids=lambda: [tree.tree_id for tree in TRILLIAN_ADMIN.logs()],
+    check_root=check_root,
+    poll_seconds=app.config['MIRROR_POLL_SECONDS'],
+    followers=[
+        follower
+        for follower in (HASH_STORES, FRONTIERS, LEAF_BLOOMS, TILE_WRITER)
+        if follower is not None
+    ],
+) if app.config['MIRROR_DIR'] else None
+
+
+@app.before_first_request
+def start_mirror():
+    if MIRROR is not None:
+        MIRROR.start()
+
+
+@app.errorhandler(BackendOverloaded)
+def backend_overloaded(e):
+    return json_response(
+        status_=503,
+        headers_={'Retry-After': str(e.retry_after)},
+        description=str(e),
+    )
 
 
 @app.route('/demoapi/logs', methods=['GET'])
@@ -137,6 +609,64 @@ def to_b64(binary):
     return base64.b64encode(binary).decode('ascii')
 
 
+def hash_from_b64(value, name):
+    """
+    Decodes a base64 (or URL-safe base64) SHA-256 hash from a request argument.
+    """
+    try:
+        binary = base64.b64decode(
+            value.replace('-', '+').replace('_', '/').replace(' ', '+'),
+            validate=True
+        )
+    except (ValueError, TypeError):
+        binary = None
+
+    if binary is None or len(binary) != 32:
+        raise JsonError(
+            status=400,
+            description='`{}` must be a base64-encoded 32 byte hash'.format(
+                name)
+        )
+
+    return binary
+
+
+def int_args(*names):
+    """
+    Reads required integer arguments from the query string.
+    """
+    try:
+        return [int(request.args[name]) for name in names]
+    except (KeyError, ValueError):
+        raise JsonError(
+            status=400,
+            description='Request requires integer arguments {}'.format(
+                ', '.join('`{}`'.format(name) for name in names)
+            )
+        )
+
+
+RPC_ERROR_STATUSES = {
+    grpc.StatusCode.INVALID_ARGUMENT: 400,
+    grpc.StatusCode.OUT_OF_RANGE: 400,
+    grpc.StatusCode.FAILED_PRECONDITION: 400,
+    grpc.StatusCode.NOT_FOUND: 404,
+}
+
+
+def json_error_from_rpc(e):
+    """
+    Turns an RpcError caused by a bad request into a JsonError. Errors which
+    aren't the client's fault are re-raised.
+    """
+    status = RPC_ERROR_STATUSES.get(e.code())
+
+    if status is None:
+        raise e
+
+    return JsonError(status_=status, status=status, description=e.details())
+
+
 @app.route('/demoapi/logs/<int:id>', methods=['DELETE'])
 @as_json
 def log_delete(id):
@@ -170,10 +700,77 @@ def log_single(id):
 @app.route('/v1beta1/logs/<int:log_id>/roots:latest')
 @as_json
 def get_latest_signed_log_root(log_id):
+    """
+    With `since=N`, also returns a consistency proof from tree size N to the
+    latest root, so a syncing client needs only one request.
+    """
+    log_client = make_log_client(log_id)
+    signed_log_root = log_client.get_signed_log_root()
+    log_root = verified(log_id, signed_log_root)
+
+    response = SignedLogRootSerializer(signed_log_root, log_root).json()
 
-    signed_log_root = make_log_client(log_id).get_signed_log_root()
+    if 'since' not in request.args:
+        return response
 
-    return SignedLogRootSerializer(signed_log_root).json()
+    since, = int_args('since')
+
+    if not 0 <= since <= log_root.tree_size:
+        raise JsonError(
+            status=400,
+            description='`since` must be between 0 and the tree size ({})'
+                        .format(log_root.tree_size)
+        )
+
+    try:
+        proof = cached_consistency_proof(
+            log_client, log_id, since, log_root.tree_size
+        )
+    except ValueError as e:
+        raise JsonError(status=400, description=str(e))
+    except grpc.RpcError as e:
+        raise json_error_from_rpc(e)
+
+    response['consistency_proof'] = OrderedDict([
+        ('first_tree_size', since),
+        ('second_tree_size', log_root.tree_size),
+        ('hashes', proof),
+    ])
+    return response
+
+
+@app.route('/v1beta1/logs/<int:log_id>/roots:at')
+@as_json
+def get_signed_log_root_at(log_id):
+    """
+    Looks up the latest root we've seen at or before either `tree_size` or
+    `timestamp_nanos`.
+    """
+    if ROOT_HISTORY is None:
+        raise JsonError(status_=404, status=404,
+                        description='Root history is not enabled')
+
+    names = [
+        name for name in ('tree_size', 'timestamp_nanos')
+        if name in request.args
+    ]
+
+    if len(names) != 1:
+        raise JsonError(
+            status=400,
+            description='Pass one of `tree_size` or `timestamp_nanos`'
+        )
+
+    value, = int_args(names[0])
+    signed_log_root = ROOT_HISTORY.at_or_before(log_id, **{names[0]: value})
+
+    if signed_log_root is None:
+        raise JsonError(status_=404, status=404,
+                        description='No root found at or before that point')
+
+    return SignedLogRootSerializer(
+        signed_log_root, verified(log_id, signed_log_root)
+    ).json()
 
 
 @app.route('/v1beta1/logs/<int:log_id>:consistency_proof')
@@ -203,48 +800,729 @@ def get_consistency_proof(log_id):
     return {
         'proof': [to_b64(h) for h in response.proof.hashes],
         'signed_log_root': SignedLogRootSerializer(
-            response.signed_log_root
+            response.signed_log_root,
+            verified(log_id, response.signed_log_root)
         ).json(),
     }
 
 
-@app.route('/v1beta1/logs/<int:log_id>/leaves:by_range')
+def serialize_proof(proof):
+    return OrderedDict([
+        ('leaf_index', proof.leaf_index),
+        ('hashes', [to_b64(h) for h in proof.hashes]),
+    ])
+
+
+def local_hash_store(log_id, tree_size):
+    """
+    Returns the log's LeafHashStore if it holds the tree of `tree_size`,
+    otherwise None.
+    """
+    if HASH_STORES is None:
+        return None
+
+    hash_store = HASH_STORES.get(log_id)
+
+    if hash_store is None or tree_size > hash_store.size:
+        return None
+
+    return hash_store
+
+
+def definitely_absent(log_id, leaf_hash, tree_size):
+    """
+    True if the Bloom filter covers the tree of `tree_size` and no leaf in it
+    has `leaf_hash`. False means it's worth looking.
+    """
+    return (
+        LEAF_BLOOMS is not None and tree_size is not None and
+        LEAF_BLOOMS.size(log_id) >= tree_size and
+        not LEAF_BLOOMS.might_contain(log_id, leaf_hash)
+    )
+
+
+def cached_inclusion_proof(log_client, log_id, leaf_index, tree_size):
+    """
+    Proofs are shared by every client verifying the same leaf against the same
+    tree size, so they're cached by (log_id, leaf_index, tree_size).
+    """
+    def fetch():
+        hash_store = local_hash_store(log_id, tree_size)
+
+        if hash_store is None:
+            response = log_client.get_inclusion_proof(leaf_index, tree_size)
+            verified_covering(log_id, response.signed_log_root, tree_size)
+            return serialize_proof(response.proof)
+
+        return OrderedDict([
+            ('leaf_index', leaf_index),
+            ('hashes', [
+                to_b64(h)
+                for h in hash_store.inclusion_proof(leaf_index, tree_size)
+            ]),
+        ])
+
+    return PROOF_CACHE.get_or_compute(
+        ('inclusion', log_id, leaf_index, tree_size), fetch
+    )
+
+
+def cached_consistency_proof(log_client, log_id, first_tree_size,
+                             second_tree_size):
+    """
+    Returns the base64 hashes of the consistency proof between two tree sizes,
+    cached by (log_id, first_tree_size, second_tree_size).
+    """
+    if first_tree_size in (0, second_tree_size):
+        return []
+
+    def fetch():
+        hash_store = local_hash_store(log_id, second_tree_size)
+
+        if hash_store is None:
+            response = log_client.get_consistency_proof(
+                first_tree_size, second_tree_size
+            )
+            verified_covering(
+                log_id, response.signed_log_root, second_tree_size
+            )
+            hashes = response.proof.hashes
+        else:
+            hashes = hash_store.consistency_proof(
+                first_tree_size, second_tree_size
+            )
+
+        return [to_b64(h) for h in hashes]
+
+    return PROOF_CACHE.get_or_compute(
+        ('consistency', log_id, first_tree_size, second_tree_size), fetch
+    )
+
+
+@app.route('/v1beta1/logs/<int:log_id>:subtree_hash')
 @as_json
-def get_leaves_by_range(log_id):
-    def serialize(leaf):
-        # This should look like a `LogLeaf` message from
-        # https://github.com/google/trillian/blob/master/trillian_log_api.proto
+def get_subtree_hash(log_id):
+    """
+    Returns the Merkle Tree Hash of the complete subtree of 2^`level` leaves
+    starting at leaf `index` * 2^`level`, so auditors can check a large range
+    by splitting it in half rather than downloading every leaf hash.
+    """
+    level, index = int_args('level', 'index')
+
+    if not 0 <= level < 64 or index < 0:
+        raise JsonError(
+            status=400,
+            description='`level` must be between 0 and 63 and `index` >= 0'
+        )
+
+    start_index = index << level
+    end_index = start_index + (1 << level)
+
+    def compute():
+        hash_store = local_hash_store(log_id, end_index)
+
+        if hash_store is not None:
+            return hash_store.node(level, index)
+
+        # Small subtrees can be hashed from a single request for their leaves
+        # if they haven't been mirrored yet.
+        if end_index - start_index > TrillianLogClient.MAX_LEAVES_PER_REQUEST:
+            raise JsonError(
+                status_=404, status=404,
+                description='Subtree has not been mirrored yet'
+            )
+
+        leaves = get_leaves(log_id, start_index, end_index - start_index)
+
+        if len(leaves) != end_index - start_index:
+            raise JsonError(
+                status_=404, status=404,
+                description='Subtree is not complete yet'
+            )
+
+        return merkle.root_from_leaf_hashes(
+            leaf.merkle_leaf_hash for leaf in leaves
+        )
+
+    try:
+        subtree_hash = PROOF_CACHE.get_or_compute(
+            ('subtree', log_id, level, index), compute
+        )
+    except ValueError as e:
+        raise JsonError(status_=404, status=404, description=str(e))
+    except grpc.RpcError as e:
+        raise json_error_from_rpc(e)
+
+    return {
+        'level': level,
+        'index': index,
+        'start_index': start_index,
+        'end_index': end_index,
+        'hash': to_b64(subtree_hash),
+    }
+
+
+@app.route('/v1beta1/logs/<int:log_id>/leaves/<int:leaf_index>'
+           ':inclusion_proof')
+@as_json
+def get_inclusion_proof(log_id, leaf_index):
+    tree_size, = int_args('tree_size')
+
+    try:
+        proof = cached_inclusion_proof(
+            make_log_client(log_id), log_id, leaf_index, tree_size
+        )
+    except ValueError as e:
+        raise JsonError(status=400, description=str(e))
+    except grpc.RpcError as e:
+        raise json_error_from_rpc(e)
+
+    return {
+        'tree_size': tree_size,
+        'proof': proof,
+    }
+
+
+def cached_leaf_indexes(log_client, log_id, leaf_hash, tree_size):
+    """
+    Finds the indexes of every leaf with `leaf_hash` in the tree of
+    `tree_size`. They come from the mirror's index if it holds the whole
+    tree, otherwise from Trillian, seeding the proof cache with their
+    inclusion proofs.
+    """
+    def fetch():
+        if definitely_absent(log_id, leaf_hash, tree_size):
+            return []
+
+        if local_hash_store(log_id, tree_size) is not None:
+            return [
+                leaf.leaf_index
+                for leaf in MIRROR.get_leaves_by_hash(log_id, leaf_hash)
+                if leaf.leaf_index < tree_size
+            ]
+
+        response = log_client.get_inclusion_proof_by_hash(
+            leaf_hash, tree_size
+        )
+        verified_covering(log_id, response.signed_log_root, tree_size)
 
+        for proof in response.proof:
+            PROOF_CACHE.put(
+                ('inclusion', log_id, proof.leaf_index, tree_size),
+                serialize_proof(proof)
+            )
+
+        return [proof.leaf_index for proof in response.proof]
+
+    return PROOF_CACHE.get_or_compute(
+        ('leaf_indexes', log_id, leaf_hash, tree_size), fetch
+    )
+
+
+@app.route('/v1beta1/logs/<int:log_id>/leaves:by_hash')
+@as_json
+def get_leaves_by_hash(log_id):
+    """
+    Returns every sequenced leaf with the base64 `leaf_hash`, looked up in the
+    mirror's index first and then in Trillian.
+
+    Leaves which aren't in the tree as of the mirror's last check are ruled
+    out by the Bloom filter without looking any further.
+    """
+    leaf_hash = hash_from_b64(request.args.get('leaf_hash', ''), 'leaf_hash')
+    leaves = []
+
+    if MIRROR is not None and definitely_absent(
+            log_id, leaf_hash, MIRROR.tree_size(log_id)):
         return {
-            'merkle_leaf_hash': to_b64(leaf.merkle_leaf_hash),
-            'leaf_value': to_b64(leaf.leaf_value),
-            'extra_data': None,
-            'leaf_index': leaf.leaf_index,
-            'leaf_identity_hash': None,
-            'queue_timestamp': None,
-            'integrate_timestamp': None,
+            'leaves': [],
         }
 
-    leaves = map(
-        serialize,
-        make_log_client(log_id).get_leaves_by_range(
-            start_index=int(request.args['start_index']),
-            count=int(request.args['count'])
+    if MIRROR is not None:
+        leaves = MIRROR.get_leaves_by_hash(log_id, leaf_hash)
+
+    if not leaves:
+        try:
+            leaves = make_log_client(log_id).get_leaves_by_hash([leaf_hash])
+        except grpc.RpcError as e:
+            raise json_error_from_rpc(e)
+
+    return {
+        'leaves': [serialize_leaf(leaf) for leaf in leaves],
+    }
+
+
+@app.route('/v1beta1/logs/<int:log_id>/leaves:inclusion_by_hash')
+@as_json
+def get_inclusion_proof_by_hash(log_id):
+    tree_size, = int_args('tree_size')
+    leaf_hash = hash_from_b64(request.args.get('leaf_hash', ''), 'leaf_hash')
+    log_client = make_log_client(log_id)
+
+    try:
+        proofs = [
+            cached_inclusion_proof(log_client, log_id, index, tree_size)
+            for index in cached_leaf_indexes(
+                log_client, log_id, leaf_hash, tree_size
+            )
+        ]
+    except ValueError as e:
+        raise JsonError(status=400, description=str(e))
+    except grpc.RpcError as e:
+        raise json_error_from_rpc(e)
+
+    if not proofs:
+        raise JsonError(status_=404, status=404,
+                        description='No leaf with that hash in the tree')
+
+    return {
+        'tree_size': tree_size,
+        'proofs': proofs,
+    }
+
+
+@app.route('/v1beta1/logs/<int:log_id>/leaves:batch_inclusion_proof',
+           methods=['POST'])
+@as_json
+@rate_limited
+def get_batch_inclusion_proofs(log_id):
+    """
+    Takes `tree_size` and either `leaf_indexes` or `leaf_hashes` (base64), and
+    returns a proof for each. Hashes shared between proofs are sent once in
+    `nodes`, and each proof's `path` lists indexes into `nodes`.
+
+    Leaf hashes that aren't in the tree get a null `leaf_index` and `path`.
+    """
+    data = request.json or {}
+    tree_size = data.get('tree_size')
+    leaf_indexes = data.get('leaf_indexes')
+    leaf_hashes = data.get('leaf_hashes')
+
+    if not isinstance(tree_size, int):
+        raise JsonError(
+            status=400, description='`tree_size` must be an integer'
+        )
+
+    if (leaf_indexes is None) == (leaf_hashes is None):
+        raise JsonError(
+            status=400,
+            description='Must pass one of `leaf_indexes` or `leaf_hashes`'
+        )
+
+    items = leaf_indexes if leaf_hashes is None else leaf_hashes
+    max_batch_size = app.config['MAX_BATCH_SIZE']
+
+    if not isinstance(items, list) or len(items) > max_batch_size:
+        raise JsonError(
+            status=400,
+            description='Must pass a list of at most {} leaves'.format(
+                max_batch_size)
+        )
+
+    if leaf_hashes is None:
+        if not all(isinstance(index, int) for index in items):
+            raise JsonError(
+                status=400, description='`leaf_indexes` must be integers'
+            )
+    else:
+        items = [hash_from_b64(str(h), 'leaf_hashes') for h in items]
+
+    log_client = make_log_client(log_id)
+
+    def proof_for_index(leaf_index):
+        return cached_inclusion_proof(
+            log_client, log_id, leaf_index, tree_size
         )
+
+    def proof_for_hash(leaf_hash):
+        try:
+            indexes = cached_leaf_indexes(
+                log_client, log_id, leaf_hash, tree_size
+            )
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            indexes = []
+
+        if not indexes:
+            return OrderedDict([('leaf_index', None), ('hashes', None)])
+
+        return proof_for_index(indexes[0])
+
+    try:
+        proofs = list(BATCH_EXECUTOR.map(
+            proof_for_index if leaf_hashes is None else proof_for_hash,
+            items
+        ))
+    except ValueError as e:
+        raise JsonError(status=400, description=str(e))
+    except grpc.RpcError as e:
+        raise json_error_from_rpc(e)
+
+    nodes, paths = deduplicate_nodes(proof['hashes'] for proof in proofs)
+    compact_proofs = []
+
+    for leaf, proof, path in zip(items, proofs, paths):
+        compact = OrderedDict()
+
+        if leaf_hashes is not None:
+            compact['leaf_hash'] = to_b64(leaf)
+
+        compact['leaf_index'] = proof['leaf_index']
+        compact['path'] = path
+        compact_proofs.append(compact)
+
+    return {
+        'tree_size': tree_size,
+        'nodes': nodes,
+        'proofs': compact_proofs,
+    }
+
+
+def deduplicate_nodes(hash_lists):
+    """
+    Collects the distinct hashes from several proofs into one list of nodes,
+    and rewrites each proof as a list of positions in it. A proof of None
+    stays None.
+    """
+    nodes = OrderedDict()
+    paths = [
+        None if hashes is None else [
+            nodes.setdefault(h, len(nodes)) for h in hashes
+        ] for hashes in hash_lists
+    ]
+
+    return list(nodes), paths
+
+
+def get_leaves(log_id, start_index, count):
+    """
+    Reads a range of leaves from the mirror if it has them all, otherwise from
+    Trillian.
+    """
+    end = start_index + min(count, TrillianLogClient.MAX_LEAVES_PER_REQUEST)
+
+    if MIRROR is not None and 0 <= start_index < end:
+        leaves = MIRROR.get_leaves(log_id, start_index, end)
+
+        if leaves is not None:
+            return leaves
+
+    return make_log_client(log_id).get_leaves_by_range(
+        start_index=start_index,
+        count=count
     )
 
+
+def serialize_leaf(leaf):
+    # This should look like a `LogLeaf` message from
+    # https://github.com/google/trillian/blob/master/trillian_log_api.proto
+
     return {
-        'leaves': leaves
+        'merkle_leaf_hash': to_b64(leaf.merkle_leaf_hash),
+        'leaf_value': to_b64(leaf.leaf_value),
+        'extra_data': None,
+        'leaf_index': leaf.leaf_index,
+        'leaf_identity_hash': (
+            to_b64(leaf.leaf_identity_hash) if leaf.leaf_identity_hash
+            else None
+        ),
+        'queue_timestamp': None,
+        'integrate_timestamp': None,
     }
 
 
-@app.route('/v1beta1/logs/<int:log_id>/leaves', methods=['POST'])
+@app.route('/v1beta1/logs/<int:log_id>/leaves/<int:leaf_index>')
 @as_json
-def insert_single_log_entry(log_id):
+def get_entry_and_proof(log_id, leaf_index):
+    """
+    Returns a leaf together with its inclusion proof for `tree_size`, in a
+    single round trip. If we've seen the signed log root for exactly
+    `tree_size`, that's included too, otherwise `signed_log_root` is null.
+
+    Trillian sends its latest root with the proof, which is only the one the
+    proof was made against if `tree_size` is the latest size, so only the
+    leaf and proof are cached.
+    """
+    tree_size, = int_args('tree_size')
     log_client = make_log_client(log_id)
 
+    def fetch():
+        response = log_client.get_entry_and_proof(leaf_index, tree_size)
+        verified_covering(log_id, response.signed_log_root, tree_size)
+        proof = serialize_proof(response.proof)
+
+        PROOF_CACHE.put(('inclusion', log_id, leaf_index, tree_size), proof)
+
+        return {
+            'leaf': serialize_leaf(response.leaf),
+            'proof': proof,
+        }
+
     try:
-        log_client.queue_entry_base64(request.json['base64_data'])
+        entry_and_proof = PROOF_CACHE.get_or_compute(
+            ('entry_and_proof', log_id, leaf_index, tree_size), fetch
+        )
+    except ValueError as e:
+        raise JsonError(status=400, description=str(e))
+    except grpc.RpcError as e:
+        raise json_error_from_rpc(e)
+
+    return dict(
+        entry_and_proof,
+        tree_size=tree_size,
+        signed_log_root=signed_log_root_at(log_id, tree_size),
+    )
+
+
+def signed_log_root_at(log_id, tree_size):
+    """
+    The serialized signed log root for exactly `tree_size` from the root
+    history, or None if we haven't seen one.
+    """
+    if ROOT_HISTORY is None:
+        return None
+
+    signed_log_root = ROOT_HISTORY.at_or_before(log_id, tree_size=tree_size)
+
+    if signed_log_root is None:
+        return None
+
+    log_root = verified(log_id, signed_log_root)
+
+    if log_root.tree_size != tree_size:
+        return None
+
+    return SignedLogRootSerializer(signed_log_root, log_root).json()
+
+
+@app.route('/v1beta1/logs/<int:log_id>:consistency_proofs')
+@as_json
+@rate_limited
+def get_consistency_proof_chain(log_id):
+    """
+    Takes a comma-separated, increasing list of `tree_sizes` and returns the
+    consistency proof between each consecutive pair. Hashes shared between
+    the proofs are sent once in `nodes`, and each proof's `path` lists indexes
+    into `nodes`.
+    """
+    try:
+        tree_sizes = [
+            int(size) for size in request.args['tree_sizes'].split(',')
+        ]
+    except (KeyError, ValueError):
+        raise JsonError(
+            status=400,
+            description='Request requires `tree_sizes`, a comma-separated '
+                        'list of integers'
+        )
+
+    if len(tree_sizes) < 2 or len(tree_sizes) > app.config['MAX_BATCH_SIZE']:
+        raise JsonError(
+            status=400,
+            description='`tree_sizes` must have between 2 and {} '
+                        'entries'.format(app.config['MAX_BATCH_SIZE'])
+        )
+
+    if tree_sizes[0] <= 0 or any(
+            a >= b for a, b in zip(tree_sizes, tree_sizes[1:])):
+        raise JsonError(
+            status=400,
+            description='`tree_sizes` must be positive and increasing'
+        )
+
+    log_client = make_log_client(log_id)
+    pairs = list(zip(tree_sizes, tree_sizes[1:]))
+
+    try:
+        proofs = list(BATCH_EXECUTOR.map(
+            lambda pair: cached_consistency_proof(log_client, log_id, *pair),
+            pairs
+        ))
+    except ValueError as e:
+        raise JsonError(status=400, description=str(e))
+    except grpc.RpcError as e:
+        raise json_error_from_rpc(e)
+
+    nodes, paths = deduplicate_nodes(proofs)
+
+    return {
+        'nodes': nodes,
+        'proofs': [
+            OrderedDict([
+                ('first_tree_size', first),
+                ('second_tree_size', second),
+                ('path', path),
+            ]) for (first, second), path in zip(pairs, paths)
+        ],
+    }
+
+
+@app.route('/v1beta1/logs/<int:log_id>/tile/<path:tile>')
+def get_tile(log_id, tile):
+    """
+    Serves a tile written by TILE_WRITER. Only full tiles are written, and they
+    never change, so they can be cached forever.
+    """
+    if TILE_WRITER is None:
+        raise JsonError(status_=404, status=404,
+                        description='Tiles are not enabled')
+
+    if tile.endswith('.tmp'):
+        raise JsonError(status_=404, status=404, description='No such tile')
+
+    response = send_from_directory(
+        TILE_WRITER.log_directory(log_id), pjoin('tile', tile),
+        mimetype='application/octet-stream'
+    )
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@app.route('/v1beta1/logs/<int:log_id>/leaves/pages/<int:page>')
+def get_leaf_page(log_id, page):
+    """
+    Returns the leaves [page * LEAF_PAGE_SIZE, (page + 1) * LEAF_PAGE_SIZE).
+    Unlike leaves:by_range, every client asks for the same pages, so they
+    cache well.
+    """
+    page_size = app.config['LEAF_PAGE_SIZE']
+    bodies = LEAF_PAGE_CACHE.get((log_id, page))
+    is_full = bodies is not None
+
+    if bodies is None:
+        try:
+            leaves = get_leaves(log_id, page * page_size, page_size)
+        except ValueError as e:
+            raise JsonError(status_=404, status=404, description=str(e))
+        except grpc.RpcError as e:
+            raise json_error_from_rpc(e)
+
+        body = json.dumps(OrderedDict([
+            ('page', page),
+            ('page_size', page_size),
+            ('leaves', [serialize_leaf(leaf) for leaf in leaves]),
+        ]), separators=(',', ':')).encode('utf-8')
+
+        is_full = len(leaves) == page_size
+        bodies = (body, gzip.compress(body) if is_full else None)
+
+        if is_full:
+            LEAF_PAGE_CACHE.put((log_id, page), bodies)
+
+    body, gzipped = bodies
+    headers = {
+        'Vary': 'Accept-Encoding',
+        'Cache-Control': (
+            'public, max-age=31536000, immutable' if is_full
+            else 'public, max-age={}'.format(
+                app.config['PARTIAL_LEAF_PAGE_MAX_AGE'])
+        ),
+    }
+
+    if 'gzip' in request.accept_encodings:
+        body = gzipped or gzip.compress(body)
+        headers['Content-Encoding'] = 'gzip'
+
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+@app.route('/v1beta1/logs/<int:log_id>/leaves:hashes')
+@rate_limited
+def get_leaf_hashes_by_range(log_id):
+    """
+    Returns just the 32 byte merkle_leaf_hash of each leaf in a range, packed
+    together, for clients which only need to recompute roots. It's a base64
+    blob in JSON, or raw bytes with `format=binary`.
+
+    Fewer hashes than asked for may be returned, eg at the end of the log.
+    """
+    start_index, count = int_args('start_index', 'count')
+
+    if start_index < 0 or count <= 0:
+        raise JsonError(
+            status=400,
+            description='`start_index` must be >= 0 and `count` must be > 0'
+        )
+
+    end = start_index + min(count, app.config['MAX_LEAF_HASH_RANGE'])
+    hash_store = HASH_STORES.get(log_id) if HASH_STORES is not None else None
+
+    if hash_store is not None and start_index < hash_store.size:
+        hashes = hash_store.leaf_hashes(
+            start_index, min(end, hash_store.size)
+        )
+    else:
+        try:
+            leaves = get_leaves(log_id, start_index, end - start_index)
+        except ValueError as e:
+            raise JsonError(status=400, description=str(e))
+        except grpc.RpcError as e:
+            raise json_error_from_rpc(e)
+
+        hashes = b''.join(leaf.merkle_leaf_hash for leaf in leaves)
+
+    if request.args.get('format') == 'binary':
+        return Response(hashes, mimetype='application/octet-stream')
+
+    return json_response(
+        start_index=start_index,
+        count=len(hashes) // merkle.HASH_SIZE,
+        hashes=to_b64(hashes),
+    )
+
+
+@app.route('/v1beta1/logs/<int:log_id>/leaves:by_range')
+@as_json
+@rate_limited
+def get_leaves_by_range(log_id):
+    """
+    With `verify=true`, recomputes every leaf's merkle_leaf_hash from its value
+    and reports any that don't match what Trillian returned.
+    """
+    leaves = get_leaves(
+        log_id,
+        start_index=int(request.args['start_index']),
+        count=int(request.args['count'])
+    )
+
+    response = {
+        'leaves': map(serialize_leaf, leaves)
+    }
+
+    if request.args.get('verify') == 'true':
+        expected = merkle.leaf_hashes(
+            (leaf.leaf_value for leaf in leaves), executor=HASH_EXECUTOR
+        )
+        mismatched = [
+            leaf.leaf_index for leaf, leaf_hash in zip(leaves, expected)
+            if leaf.merkle_leaf_hash != leaf_hash
+        ]
+
+        if mismatched:
+            app.logger.error(
+                'Log %s returned leaves with bad hashes: %s',
+                log_id, mismatched
+            )
+
+        response['verified'] = not mismatched
+        response['mismatched_leaf_indexes'] = mismatched
+
+    return response
+
+
+@app.route('/v1beta1/logs/<int:log_id>/leaves', methods=['POST'])
+@idempotent
+@as_json
+@rate_limited
+def insert_single_log_entry(log_id):
+    """
+    Entries are identified by the SHA-256 of their value, and one that was
+    recently submitted to the log gets the same response again without
+    being queued twice.
+    """
+    try:
+        leaf_value = base64.b64decode(request.json['base64_data'])
     except ValueError as e:
         raise JsonError(description=str(e))
     except KeyError as e:
@@ -252,7 +1530,21 @@ def insert_single_log_entry(log_id):
             description='JSON payload must include a "base64_data" value'
         )
 
-    return {'message': 'OK, queued entry for inclusion in merkle tree'}
+    identity_hash = leaf_identity_hash(leaf_value)
+
+    def queue():
+        make_log_client(log_id).queue_entry(leaf_value)
+
+        return {
+            'message': 'OK, queued entry for inclusion in merkle tree',
+            'leaf_identity_hash': to_b64(identity_hash),
+        }
+
+    recent_submissions = RECENT_SUBMISSIONS.get_or_compute(
+        log_id,
+        lambda: LRUCache(app.config['RECENT_SUBMISSIONS_PER_LOG'])
+    )
+    return recent_submissions.get_or_compute(identity_hash, queue)
 
 
 def make_normalized_json(some_dict):
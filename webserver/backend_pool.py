@@ -0,0 +1,309 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from collections import defaultdict, deque
+
+import grpc
+
+import trillian_admin_api_pb2_grpc
+import trillian_log_api_pb2_grpc
+
+
+LOG = logging.getLogger(__name__)
+
+ROUND_ROBIN = 'round_robin'
+LEAST_OUTSTANDING = 'least_outstanding'
+
+# Status codes which tell us something is wrong with the backend itself,
+# rather than with the request we sent it.
+BACKEND_FAILURE_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+)
+
+
+class Backend():
+    """
+    A single trillian_log_server replica, with one long-lived channel shared
+    by the log and admin stubs.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.channel = grpc.insecure_channel(address)
+        self.log_stub = trillian_log_api_pb2_grpc.TrillianLogStub(
+            self.channel)
+        self.admin_stub = trillian_admin_api_pb2_grpc.TrillianAdminStub(
+            self.channel)
+
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0
+
+    def is_healthy(self, now):
+        return self.ejected_until <= now
+
+    def __repr__(self):
+        return 'Backend({!r})'.format(self.address)
+
+
+class BackendPool():
+    """
+    Spreads RPCs across several Trillian replicas.
+
+    Backends are chosen either round-robin or by fewest outstanding requests.
+    A backend which fails `max_failures` times in a row is ejected for
+    `ejection_seconds`, after which it's given traffic again.
+    """
+
+    def __init__(self, addresses, policy=ROUND_ROBIN, max_failures=3,
+                 ejection_seconds=30, hedging=None, guard=None,
+                 timeout=None):
+        if not addresses:
+            raise ValueError('At least one Trillian backend is required')
+
+        if policy not in (ROUND_ROBIN, LEAST_OUTSTANDING):
+            raise ValueError('Unknown balancing policy {!r}'.format(policy))
+
+        self.__backends = [Backend(address) for address in addresses]
+        self.__policy = policy
+        self.__max_failures = max_failures
+        self.__ejection_seconds = ejection_seconds
+        self.__hedging = hedging
+        self.__guard = guard
+        self.__timeout = timeout
+        self.__counter = itertools.count()
+        self.__lock = threading.Lock()
+
+    @property
+    def backends(self):
+        return list(self.__backends)
+
+    def pick(self, exclude=()):
+        """
+        Chooses a backend and counts a request against it. Every `pick` must
+        be followed by a `release`.
+
+        Returns None if every backend is in `exclude`.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            available = [b for b in self.__backends if b not in exclude]
+
+            if not available:
+                return None
+
+            candidates = [b for b in available if b.is_healthy(now)]
+
+            if not candidates:
+                # Everything is ejected: rather than failing outright, try the
+                # backend that's due back soonest.
+                candidates = [min(available, key=lambda b: b.ejected_until)]
+
+            if self.__policy == LEAST_OUTSTANDING:
+                backend = min(candidates, key=lambda b: b.outstanding)
+            else:
+                backend = candidates[next(self.__counter) % len(candidates)]
+
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend, error=None):
+        """
+        Records the outcome of a request made against `backend`.
+        """
+        with self.__lock:
+            backend.outstanding -= 1
+
+            if not is_backend_failure(error):
+                backend.consecutive_failures = 0
+                return
+
+            backend.consecutive_failures += 1
+
+            if backend.consecutive_failures >= self.__max_failures:
+                LOG.warning(
+                    'Ejecting %s for %ss after %s consecutive failures',
+                    backend.address, self.__ejection_seconds,
+                    backend.consecutive_failures
+                )
+                backend.ejected_until = (
+                    time.monotonic() + self.__ejection_seconds
+                )
+                backend.consecutive_failures = 0
+
+    def call(self, stub_name, method_name, request, read=False):
+        """
+        Makes a blocking RPC, eg `call('log_stub', 'QueueLeaf', request)`.
+
+        Pass `read=True` for RPCs which are safe to send twice. If the pool
+        has a HedgingPolicy, a slow read is duplicated to a second backend.
+
+        If the pool has a BackendGuard, raises BackendOverloaded rather than
+        making the call when Trillian is overloaded.
+        """
+        if self.__guard is None:
+            return self.__call(stub_name, method_name, request, read)
+
+        with self.__guard.admit(rpc_class(stub_name, read),
+                                is_backend_failure):
+            return self.__call(stub_name, method_name, request, read)
+
+    def __call(self, stub_name, method_name, request, read):
+        if read and self.__hedging is not None and len(self.__backends) > 1:
+            return self.__call_hedged(stub_name, method_name, request)
+
+        backend = self.pick()
+        started = time.monotonic()
+
+        try:
+            method = getattr(getattr(backend, stub_name), method_name)
+            response = method(request, timeout=self.__timeout)
+        except grpc.RpcError as e:
+            self.release(backend, e)
+            raise
+
+        self.release(backend)
+
+        if self.__hedging is not None:
+            self.__hedging.record(method_name, time.monotonic() - started)
+
+        return response
+
+    def __call_hedged(self, stub_name, method_name, request):
+        """
+        Sends `request` to one backend and, if it hasn't answered within the
+        hedging delay, to a second one. The first successful response wins and
+        the other call is cancelled.
+        """
+        completed = queue.Queue()
+        pending = []
+
+        def start(backend):
+            started = time.monotonic()
+            method = getattr(getattr(backend, stub_name), method_name)
+            future = method.future(request, timeout=self.__timeout)
+
+            def on_done(f):
+                if f.cancelled():
+                    self.release(backend)
+                else:
+                    error = f.exception()
+                    self.release(backend, error)
+
+                    if error is None:
+                        self.__hedging.record(
+                            method_name, time.monotonic() - started)
+
+                completed.put(f)
+
+            pending.append(future)
+            future.add_done_callback(on_done)
+            return backend
+
+        primary = start(self.pick())
+        delay = self.__hedging.delay(method_name)
+
+        try:
+            first = completed.get(timeout=delay)
+        except queue.Empty:
+            first = None
+
+            if self.__hedging.spend():
+                secondary = self.pick(exclude=[primary])
+
+                if secondary is not None:
+                    start(secondary)
+
+        outstanding = len(pending)
+
+        while True:
+            if first is None:
+                first = completed.get()
+
+            outstanding -= 1
+
+            if first.exception() is None or outstanding == 0:
+                break
+
+            first = None
+
+        for future in pending:
+            if future is not first:
+                future.cancel()
+
+        return first.result()
+
+
+class HedgingPolicy():
+    """
+    Decides when a read is slow enough to be worth duplicating.
+
+    A request is hedged once it has been outstanding for longer than
+    `percentile` of the recent latencies for the same method. Each request
+    earns `max_rate` of a hedge and each hedge spends a whole one, so no more
+    than that fraction of requests are ever duplicated.
+    """
+
+    MIN_SAMPLES = 20
+    MAX_BUDGET = 10
+
+    def __init__(self, percentile=95, max_rate=0.05, window=1000):
+        if not 0 < percentile < 100:
+            raise ValueError('`percentile` must be between 0 and 100')
+
+        self.__percentile = percentile
+        self.__max_rate = max_rate
+        self.__latencies = defaultdict(lambda: deque(maxlen=window))
+        self.__budget = 0
+        self.__lock = threading.Lock()
+
+    def record(self, method_name, seconds):
+        with self.__lock:
+            self.__latencies[method_name].append(seconds)
+
+    def delay(self, method_name):
+        """
+        Returns how long to wait before hedging, or None if we've not seen
+        enough requests to know what "slow" means yet.
+        """
+        with self.__lock:
+            self.__budget = min(
+                self.MAX_BUDGET, self.__budget + self.__max_rate)
+
+            samples = sorted(self.__latencies[method_name])
+
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+
+        index = int(len(samples) * self.__percentile / 100)
+        return samples[min(index, len(samples) - 1)]
+
+    def spend(self):
+        """
+        Takes a hedge from the budget, returning False if there's none left.
+        """
+        with self.__lock:
+            if self.__budget < 1:
+                return False
+
+            self.__budget -= 1
+            return True
+
+
+def rpc_class(stub_name, read):
+    """
+    Groups RPCs for circuit breaking, eg 'log_stub:read'.
+    """
+    return '{}:{}'.format(stub_name, 'read' if read else 'write')
+
+
+def is_backend_failure(error):
+    if error is None:
+        return False
+
+    code = getattr(error, 'code', None)
+    return callable(code) and code() in BACKEND_FAILURE_CODES
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Measures the throughput of merkle.py, in hashes per second:
+
+    python3 benchmark_merkle.py
+"""
+
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import merkle
+
+
+def measure(description, count, function):
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+
+    print('{:<45} {:>12,.0f} hashes/s'.format(description, count / seconds))
+
+
+def main():
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+
+    for leaf_size, count in [(64, 200000), (4096, 50000), (65536, 4000)]:
+        leaves = [os.urandom(leaf_size) for _ in range(count)]
+
+        measure(
+            'leaf_hashes, {} byte leaves'.format(leaf_size),
+            count,
+            lambda: merkle.leaf_hashes(leaves)
+        )
+        measure(
+            'leaf_hashes, {} byte leaves, {} threads'.format(
+                leaf_size, executor._max_workers),
+            count,
+            lambda: merkle.leaf_hashes(leaves, executor=executor)
+        )
+
+    hashes = merkle.leaf_hashes(os.urandom(32) for _ in range(200000))
+
+    measure(
+        'root_from_leaf_hashes, {} leaves'.format(len(hashes)),
+        len(hashes) - 1,
+        lambda: merkle.root_from_leaf_hashes(hashes)
+    )
+
+    tree_size = 2 ** 20
+    leaf = merkle.leaf_hash(b'leaf')
+    proof = [os.urandom(32) for _ in range(20)]
+    repeats = 20000
+
+    def verify_many():
+        for _ in range(repeats):
+            merkle.root_from_inclusion_proof(12345, tree_size, leaf, proof)
+
+    measure(
+        'root_from_inclusion_proof, tree of 2^20',
+        repeats * len(proof),
+        verify_many
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+import math
+import mmap
+import os
+import struct
+import threading
+
+from os.path import join as pjoin
+
+
+class LeafBlooms():
+    """
+    A Bloom filter over the merkle_leaf_hash of every mirrored leaf, per log,
+    so lookups for leaves which aren't in the log can be answered without
+    touching the index or Trillian. Used as a LeafMirror follower.
+    """
+
+    def __init__(self, directory, initial_capacity=65536,
+                 false_positive_rate=0.01):
+        self.__directory = directory
+        self.__initial_capacity = initial_capacity
+        self.__false_positive_rate = false_positive_rate
+        self.__logs = {}
+        self.__lock = threading.Lock()
+
+    def __log(self, log_id, create):
+        """
+        The log's filter, or None if nothing has been added for it and
+        `create` is false.
+        """
+        directory = pjoin(self.__directory, str(log_id))
+
+        with self.__lock:
+            if log_id not in self.__logs:
+                if not create and not os.path.isdir(directory):
+                    return None
+
+                self.__logs[log_id] = ScalableBloomFilter(
+                    directory, self.__initial_capacity,
+                    self.__false_positive_rate
+                )
+
+            return self.__logs[log_id]
+
+    def size(self, log_id):
+        bloom_filter = self.__log(log_id, create=False)
+        return bloom_filter.size if bloom_filter is not None else 0
+
+    def append(self, log_id, leaves):
+        bloom_filter = self.__log(log_id, create=True)
+
+        for expected, leaf in enumerate(leaves, bloom_filter.size):
+            if leaf.leaf_index != expected:
+                raise ValueError(
+                    'Expected leaf {}, got {}'.format(
+                        expected, leaf.leaf_index)
+                )
+
+        bloom_filter.add_all(leaf.merkle_leaf_hash for leaf in leaves)
+
+    def might_contain(self, log_id, leaf_hash):
+        """
+        False if no leaf mirrored so far has `leaf_hash`. True means it's
+        probably been mirrored, or that the log has no filter to check.
+        """
+        bloom_filter = self.__log(log_id, create=False)
+        return bloom_filter is None or leaf_hash in bloom_filter
+
+
+class ScalableBloomFilter():
+    """
+    A Bloom filter of SHA-256 hashes which grows as items are added, kept in
+    `directory` as a series of memory-mapped stage files.
+
+    Each stage holds twice as many items as the last, with half the false
+    positive rate, so the overall rate stays below `false_positive_rate`
+    however large the log gets.
+
+    The items are already uniformly distributed hashes, so the bit positions
+    are taken from the item itself rather than hashing it again.
+
+    Each stage file records its own size and number of hashes, so existing
+    stages keep working if the settings change; only new stages use them.
+    """
+
+    def __init__(self, directory, initial_capacity, false_positive_rate):
+        os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__initial_capacity = initial_capacity
+        self.__false_positive_rate = false_positive_rate
+        self.__stages = []
+        self.__lock = threading.Lock()
+
+        while os.path.exists(self.__path(len(self.__stages))):
+            self.__stages.append(self.__stage(len(self.__stages)))
+
+        if not self.__stages:
+            self.__stages.append(self.__stage(0))
+
+    def __path(self, number):
+        return pjoin(self.__directory, 'stage-{:02d}'.format(number))
+
+    def __stage(self, number):
+        """
+        Opens a stage, or creates it with the current settings. A stage which
+        already has a header keeps its own parameters.
+        """
+        capacity = self.__initial_capacity << number
+        false_positive_rate = self.__false_positive_rate / 2 ** (number + 1)
+        bits = int(math.ceil(
+            -capacity * math.log(false_positive_rate) / math.log(2) ** 2
+        ))
+
+        return _Stage(
+            self.__path(number), capacity, bits,
+            hash_count=max(1, round(bits / capacity * math.log(2)))
+        )
+
+    @property
+    def size(self):
+        return sum(stage.count for stage in self.__stages)
+
+    def add_all(self, items):
+        with self.__lock:
+            for item in items:
+                stage = self.__stages[-1]
+
+                if stage.count >= stage.capacity:
+                    stage.flush()
+                    stage = self.__stage(len(self.__stages))
+                    self.__stages.append(stage)
+
+                stage.add(item)
+
+            self.__stages[-1].flush()
+
+    def __contains__(self, item):
+        return any(item in stage for stage in self.__stages)
+
+
+class _Stage():
+    """
+    One memory-mapped stage file: a header followed by the bits.
+    """
+
+    MAGIC = b'BLM1'
+
+    # magic, hash_count, capacity, bits, count of items added
+    HEADER = struct.Struct('>4sIQQQ')
+
+    def __init__(self, path, capacity=None, bits=None, hash_count=None):
+        """
+        Opens the stage at `path`, or creates it with the parameters given if
+        it doesn't exist. A stage left empty or short by a crash while it was
+        being created is finished off, since nothing has been added to it.
+        """
+        with open(path, 'a+b') as f:
+            if os.fstat(f.fileno()).st_size < self.HEADER.size:
+                if capacity is None:
+                    raise ValueError(
+                        'Bloom filter stage {} is empty'.format(path)
+                    )
+
+                f.truncate(0)
+                f.write(self.HEADER.pack(
+                    self.MAGIC, hash_count, capacity, bits, 0
+                ))
+                f.truncate(self.HEADER.size + (bits + 7) // 8)
+                f.flush()
+
+            f.seek(0)
+            header = f.read(self.HEADER.size)
+            magic, hash_count, capacity, bits, count = self.HEADER.unpack(
+                header
+            )
+            length = self.HEADER.size + (bits + 7) // 8
+
+            if magic != self.MAGIC or not capacity or not bits:
+                raise ValueError('{} is not a Bloom filter stage'.format(path))
+
+            if os.fstat(f.fileno()).st_size < length:
+                if count:
+                    raise ValueError(
+                        'Bloom filter stage {} is truncated'.format(path)
+                    )
+
+                f.truncate(length)
+
+            self.__map = mmap.mmap(f.fileno(), length)
+
+        self.capacity = capacity
+        self.count = count
+        self.__bits = bits
+        self.__hash_count = hash_count
+
+    def __positions(self, item):
+        h1 = int.from_bytes(item[:8], 'big')
+        h2 = int.from_bytes(item[8:16], 'big') | 1
+        offset = self.HEADER.size * 8
+
+        for i in range(self.__hash_count):
+            yield offset + (h1 + i * h2) % self.__bits
+
+    def add(self, item):
+        for position in self.__positions(item):
+            self.__map[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
+
+    def flush(self):
+        """
+        Saves the count after the bits it covers, so a crash part way through
+        only leaves extra bits set, for items which will be added again.
+        """
+        self.__map.flush()
+        self.HEADER.pack_into(
+            self.__map, 0, self.MAGIC, self.__hash_count, self.capacity,
+            self.__bits, self.count
+        )
+        self.__map.flush()
+
+    def __contains__(self, item):
+        return all(
+            self.__map[position >> 3] & (1 << (position & 7))
+            for position in self.__positions(item)
+        )
@@ -0,0 +1,106 @@
+import threading
+
+from collections import OrderedDict
+
+
+class LRUCache():
+    """
+    A thread-safe, size-bounded cache which evicts the least recently used
+    entry first.
+
+    `get_or_compute` coalesces concurrent misses: if several threads ask for
+    the same missing key, only one of them computes it and the rest wait for
+    its result.
+
+    With `max_bytes`, the cache is also bounded by the total size of its
+    values, as measured by `size_of`.
+    """
+
+    def __init__(self, max_entries, max_bytes=None, size_of=len):
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__size_of = size_of
+        self.__bytes = 0
+        self.__entries = OrderedDict()
+        self.__pending = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, default=None):
+        with self.__lock:
+            try:
+                self.__entries.move_to_end(key)
+            except KeyError:
+                return default
+
+            return self.__entries[key]
+
+    @property
+    def bytes(self):
+        return self.__bytes
+
+    def put(self, key, value):
+        with self.__lock:
+            if self.__max_bytes is not None:
+                if key in self.__entries:
+                    self.__bytes -= self.__size_of(self.__entries[key])
+
+                self.__bytes += self.__size_of(value)
+
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+
+            while len(self.__entries) > self.__max_entries or (
+                    self.__max_bytes is not None and
+                    self.__bytes > self.__max_bytes):
+                _, evicted = self.__entries.popitem(last=False)
+
+                if self.__max_bytes is not None:
+                    self.__bytes -= self.__size_of(evicted)
+
+    def get_or_compute(self, key, compute):
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                return self.__entries[key]
+
+            pending = self.__pending.get(key)
+            is_leader = pending is None
+
+            if is_leader:
+                pending = self.__pending[key] = _Pending()
+
+        if not is_leader:
+            return pending.wait()
+
+        try:
+            pending.value = compute()
+        except Exception as e:
+            pending.error = e
+            raise
+        else:
+            self.put(key, pending.value)
+        finally:
+            with self.__lock:
+                del self.__pending[key]
+
+            pending.done.set()
+
+        return pending.value
+
+
+class _Pending():
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+
+        if self.error is not None:
+            raise self.error
+
+        return self.value
@@ -0,0 +1,170 @@
+import binascii
+import logging
+import os
+import struct
+import threading
+
+from collections import OrderedDict
+from os.path import join as pjoin
+
+import merkle
+
+
+LOG = logging.getLogger(__name__)
+
+
+class LogFrontiers():
+    """
+    Keeps a CompactRange of every log's mirrored leaves, so the root hashes
+    Trillian publishes can be checked against the leaves without rehashing
+    the whole tree. Used as a LeafMirror follower.
+
+    Each frontier is saved to `directory` after every batch of leaves, so
+    after a restart it carries on from where it was rather than from leaf 0.
+    """
+
+    def __init__(self, directory, max_pending_roots=1000):
+        os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__max_pending_roots = max_pending_roots
+        self.__logs = {}
+        self.__lock = threading.Lock()
+
+    def __log(self, log_id):
+        with self.__lock:
+            if log_id not in self.__logs:
+                self.__logs[log_id] = _LogFrontier(
+                    log_id, pjoin(self.__directory, str(log_id)),
+                    self.__max_pending_roots
+                )
+
+            return self.__logs[log_id]
+
+    def size(self, log_id):
+        return self.__log(log_id).size
+
+    def append(self, log_id, leaves):
+        self.__log(log_id).append(leaves)
+
+    def root_hash(self, log_id):
+        return self.__log(log_id).root_hash()
+
+    def check(self, log_id, log_root):
+        """
+        Checks a LogRootV1 published by Trillian against the mirrored leaves.
+
+        Returns True or False if the frontier is at the root's tree size.
+        Roots for larger trees are kept and checked once the mirror reaches
+        them, and None is returned. Roots for smaller trees can't be checked.
+
+        Mismatches are logged as errors.
+        """
+        return self.__log(log_id).check(log_root.tree_size, log_root.root_hash)
+
+
+class _LogFrontier():
+    SIZE = struct.Struct('>Q')
+
+    def __init__(self, log_id, path, max_pending_roots):
+        self.__log_id = log_id
+        self.__path = path
+        self.__max_pending_roots = max_pending_roots
+        self.__pending = OrderedDict()  # tree_size: root_hash
+        self.__lock = threading.Lock()
+        self.__range = self.__load()
+        self.__root = None  # (tree_size, root_hash) of the last root computed
+
+    def __load(self):
+        try:
+            with open(self.__path, 'rb') as f:
+                saved = f.read()
+        except FileNotFoundError:
+            return merkle.CompactRange()
+
+        size, = self.SIZE.unpack_from(saved)
+        hashes = saved[self.SIZE.size:]
+
+        return merkle.CompactRange(size, [
+            hashes[i:i + 32] for i in range(0, len(hashes), 32)
+        ])
+
+    def __save(self):
+        """
+        Writes the frontier to a temporary file and renames it into place, so
+        a crash leaves either the old frontier or the new one.
+        """
+        temporary_path = self.__path + '.tmp'
+
+        with open(temporary_path, 'wb') as f:
+            f.write(self.SIZE.pack(self.__range.size))
+            f.write(b''.join(self.__range.hashes))
+
+        os.replace(temporary_path, self.__path)
+
+    @property
+    def size(self):
+        return self.__range.size
+
+    def root_hash(self):
+        with self.__lock:
+            return self.__root_hash()
+
+    def __root_hash(self):
+        """
+        Every published root is checked, mostly against the same tree size,
+        so the root is only recomputed once the frontier has moved on.
+        """
+        if self.__root is None or self.__root[0] != self.__range.size:
+            self.__root = (self.__range.size, self.__range.root_hash())
+
+        return self.__root[1]
+
+    def append(self, leaves):
+        with self.__lock:
+            for expected, leaf in enumerate(leaves, self.__range.size):
+                if leaf.leaf_index != expected:
+                    raise ValueError(
+                        'Expected leaf {}, got {}'.format(
+                            expected, leaf.leaf_index)
+                    )
+
+            for leaf in leaves:
+                self.__range.append(leaf.merkle_leaf_hash)
+                root_hash = self.__pending.pop(self.__range.size, None)
+
+                if root_hash is not None:
+                    self.__compare(self.__range.size, root_hash)
+
+            self.__save()
+
+    def check(self, tree_size, root_hash):
+        with self.__lock:
+            if tree_size == self.__range.size:
+                return self.__compare(tree_size, root_hash)
+
+            if tree_size > self.__range.size:
+                self.__pending[tree_size] = root_hash
+
+                while len(self.__pending) > self.__max_pending_roots:
+                    self.__pending.popitem(last=False)
+
+            return None
+
+    def __compare(self, tree_size, root_hash):
+        expected = self.__root_hash()
+
+        if root_hash != expected:
+            LOG.error(
+                'Log %s published root hash %s for tree size %d, but its '
+                'leaves hash to %s',
+                self.__log_id, hex_hash(root_hash), tree_size,
+                hex_hash(expected)
+            )
+            return False
+
+        return True
+
+
+def hex_hash(h):
+    return binascii.hexlify(h).decode('ascii')
@@ -0,0 +1,295 @@
+import mmap
+import os
+import threading
+
+from os.path import join as pjoin
+
+import merkle
+
+from cache import LRUCache
+from merkle import HASH_SIZE
+
+
+class LeafHashStores():
+    """
+    A LeafHashStore for every log, kept under one directory. Can be used as a
+    LeafMirror follower.
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__stores = {}
+        self.__lock = threading.Lock()
+
+    def log(self, log_id):
+        """
+        The log's store, created if it doesn't exist yet.
+        """
+        with self.__lock:
+            if log_id not in self.__stores:
+                self.__stores[log_id] = LeafHashStore(
+                    pjoin(self.__directory, str(log_id))
+                )
+
+            return self.__stores[log_id]
+
+    def get(self, log_id):
+        """
+        The log's store, or None if none has been written for it.
+        """
+        directory = pjoin(self.__directory, str(log_id))
+
+        with self.__lock:
+            if log_id not in self.__stores:
+                if not os.path.isdir(directory):
+                    return None
+
+                self.__stores[log_id] = LeafHashStore(directory)
+
+            return self.__stores[log_id]
+
+    def size(self, log_id):
+        return self.log(log_id).size
+
+    def append(self, log_id, leaves):
+        self.log(log_id).append(leaves)
+
+
+class LeafHashStore():
+    """
+    The Merkle tree of one log, kept as fixed-width files of 32 byte hashes
+    which are read through mmap.
+
+    `level-00` holds the leaf hashes. `level-NN` holds the hash of every
+    complete subtree of 2^NN leaves, in order, so the hash of any aligned
+    subtree is a single read. Other ranges are built from O(log n) of those.
+
+    Appending is only done from one thread at a time, but reads may happen
+    from any thread. Readers only see leaves up to `size`, which is raised
+    once all of the parents of the new leaves have been written.
+    """
+
+    MAX_LEVELS = 64
+
+    def __init__(self, directory, max_cached_ranges=10000):
+        os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__files = []
+        self.__maps = []
+        self.__counts = []
+        self.__map_lock = threading.Lock()
+        self.__ranges = LRUCache(max_cached_ranges)
+
+        for level in range(self.MAX_LEVELS):
+            path = self.__path(level)
+
+            if level > 0 and not os.path.exists(path):
+                break
+
+            self.__open_level(level)
+
+        # Complete any parents that weren't written before a restart.
+        self.__build_parents()
+        self.__size = self.__counts[0]
+
+    def __path(self, level):
+        return pjoin(self.__directory, 'level-{:02d}'.format(level))
+
+    def __open_level(self, level):
+        f = open(self.__path(level), 'a+b')
+        count = os.fstat(f.fileno()).st_size // HASH_SIZE
+        f.truncate(count * HASH_SIZE)
+
+        self.__files.append(f)
+        self.__maps.append(None)
+        self.__counts.append(count)
+
+    @property
+    def size(self):
+        return self.__size
+
+    def append(self, leaves):
+        """
+        Adds LogLeaf messages, which must be sorted and start at `size`.
+        """
+        for expected, leaf in enumerate(leaves, self.size):
+            if leaf.leaf_index != expected:
+                raise ValueError(
+                    'Expected leaf {}, got {}'.format(
+                        expected, leaf.leaf_index)
+                )
+
+        self.__write(0, b''.join(leaf.merkle_leaf_hash for leaf in leaves))
+        self.__build_parents()
+        self.__size = self.__counts[0]
+
+    def __write(self, level, hashes):
+        self.__files[level].write(hashes)
+        self.__files[level].flush()
+        self.__counts[level] += len(hashes) // HASH_SIZE
+
+    def __build_parents(self):
+        level = 0
+
+        while self.__counts[level] >= 2:
+            if level + 1 == len(self.__counts):
+                self.__open_level(level + 1)
+
+            first_child = self.__counts[level + 1] * 2
+            children = self.__read(
+                level, first_child, self.__counts[level] - first_child
+            )
+            parents = b''.join(
+                merkle.node_hash(
+                    children[i:i + HASH_SIZE],
+                    children[i + HASH_SIZE:i + 2 * HASH_SIZE]
+                ) for i in range(0, len(children) - HASH_SIZE, 2 * HASH_SIZE)
+            )
+
+            if parents:
+                self.__write(level + 1, parents)
+
+            level += 1
+
+    def __read(self, level, index, count):
+        """
+        Reads `count` consecutive hashes from a level, starting at `index`.
+        """
+        end = (index + count) * HASH_SIZE
+        hashes = self.__maps[level]
+
+        if hashes is None or len(hashes) < end:
+            with self.__map_lock:
+                # Old maps aren't closed, since other threads may be reading
+                # from them; they're released once nothing refers to them.
+                hashes = self.__maps[level] = mmap.mmap(
+                    self.__files[level].fileno(),
+                    self.__counts[level] * HASH_SIZE,
+                    access=mmap.ACCESS_READ
+                )
+
+        return hashes[index * HASH_SIZE:end]
+
+    def leaf_hashes(self, start, end):
+        """
+        The leaf hashes of [start, end), packed together.
+        """
+        if not 0 <= start <= end <= self.size:
+            raise ValueError(
+                '[{}, {}) is not within the stored range [0, {})'.format(
+                    start, end, self.size)
+            )
+
+        return self.__read(0, start, end - start) if end > start else b''
+
+    def node(self, level, index):
+        """
+        The hash of the complete subtree of 2^level leaves starting at leaf
+        index * 2^level.
+        """
+        if level >= len(self.__counts) or index >= self.__counts[level]:
+            raise ValueError(
+                'Subtree {} at level {} has not been stored'.format(
+                    index, level)
+            )
+
+        return self.__read(level, index, 1)
+
+    def subtree_hash(self, start, end):
+        """
+        The Merkle Tree Hash of the leaves [start, end).
+        """
+        if not 0 <= start < end <= self.size:
+            raise ValueError(
+                '[{}, {}) is not within the stored range [0, {})'.format(
+                    start, end, self.size)
+            )
+
+        size = end - start
+
+        if size & (size - 1) == 0 and start % size == 0:
+            level = size.bit_length() - 1
+            return self.node(level, start >> level)
+
+        return self.__ranges.get_or_compute(
+            (start, end), lambda: self.__split_hash(start, end)
+        )
+
+    def __split_hash(self, start, end):
+        k = largest_power_of_two_below(end - start)
+
+        return merkle.node_hash(
+            self.subtree_hash(start, start + k),
+            self.subtree_hash(start + k, end)
+        )
+
+    def root_hash(self, tree_size):
+        if tree_size == 0:
+            return merkle.EMPTY_ROOT
+
+        return self.subtree_hash(0, tree_size)
+
+    def inclusion_proof(self, leaf_index, tree_size):
+        """
+        The audit path for a leaf in the tree of `tree_size`, as in RFC 6962
+        section 2.1.1.
+        """
+        if not 0 <= leaf_index < tree_size <= self.size:
+            raise ValueError(
+                'Need 0 <= leaf_index < tree_size <= {}'.format(self.size)
+            )
+
+        proof = []
+        start, end = 0, tree_size
+
+        while end - start > 1:
+            k = largest_power_of_two_below(end - start)
+
+            if leaf_index < start + k:
+                proof.append(self.subtree_hash(start + k, end))
+                end = start + k
+            else:
+                proof.append(self.subtree_hash(start, start + k))
+                start = start + k
+
+        return list(reversed(proof))
+
+    def consistency_proof(self, first_tree_size, second_tree_size):
+        """
+        The consistency proof between two tree sizes, as in RFC 6962 section
+        2.1.2.
+        """
+        if not 0 < first_tree_size <= second_tree_size <= self.size:
+            raise ValueError(
+                'Need 0 < first_tree_size <= second_tree_size <= {}'.format(
+                    self.size)
+            )
+
+        proof = []
+        start, end = 0, second_tree_size
+        m = first_tree_size
+        complete = True  # is the first tree a complete subtree so far?
+
+        while m != end:
+            k = largest_power_of_two_below(end - start)
+
+            if m - start <= k:
+                proof.append(self.subtree_hash(start + k, end))
+                end = start + k
+            else:
+                proof.append(self.subtree_hash(start, start + k))
+                start = start + k
+                complete = False
+
+        if not complete:
+            proof.append(self.subtree_hash(start, end))
+
+        return list(reversed(proof))
+
+
+def largest_power_of_two_below(n):
+    """
+    The largest power of two strictly less than `n`, for n > 1.
+    """
+    return 1 << ((n - 1).bit_length() - 1)
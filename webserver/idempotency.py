@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+import time
+
+from collections import namedtuple
+
+from cache import LRUCache
+
+
+StoredResponse = namedtuple('StoredResponse', ['status', 'mimetype', 'body'])
+
+
+class RequestInFlight(Exception):
+    pass
+
+
+class KeyReused(Exception):
+    pass
+
+
+class IdempotencyStore():
+    """
+    Remembers the response to each request made with an idempotency key for
+    `expiry_seconds`, so a client retrying the request gets the same response
+    instead of the request being carried out again.
+
+    Responses are kept in memory, up to `max_entries`. With `path`, they're
+    also kept in an SQLite database there, so they survive a restart and are
+    shared between processes.
+
+    Each key is stored with a fingerprint of its request, so a key reused for
+    a different request can be refused.
+    """
+
+    def __init__(self, expiry_seconds=24 * 60 * 60, max_entries=100000,
+                 path=None):
+        self.__expiry_seconds = expiry_seconds
+        self.__responses = LRUCache(max_entries)
+        self.__in_flight = {}  # key: fingerprint
+        self.__lock = threading.Lock()
+        self.__connection = None
+
+        if path is not None:
+            # Only used while holding the lock, so it can be shared between
+            # threads.
+            self.__connection = sqlite3.connect(
+                path, check_same_thread=False
+            )
+
+            with self.__connection:
+                self.__connection.execute(
+                    'CREATE TABLE IF NOT EXISTS responses ('
+                    '  key TEXT PRIMARY KEY,'
+                    '  fingerprint TEXT NOT NULL,'
+                    '  status INTEGER NOT NULL,'
+                    '  mimetype TEXT NOT NULL,'
+                    '  body BLOB NOT NULL,'
+                    '  expires REAL NOT NULL'
+                    ')'
+                )
+                self.__connection.execute(
+                    'CREATE INDEX IF NOT EXISTS responses_by_expiry '
+                    'ON responses (expires)'
+                )
+
+    def begin(self, key, fingerprint):
+        """
+        Returns the StoredResponse to repeat for `key`, or None if the request
+        should go ahead, in which case `finish` must be called once it's done.
+
+        Raises RequestInFlight if the same request is still being handled, or
+        KeyReused if the key was used for a different request.
+        """
+        with self.__lock:
+            if key in self.__in_flight:
+                if self.__in_flight[key] != fingerprint:
+                    raise KeyReused()
+
+                raise RequestInFlight()
+
+            stored = self.__lookup(key)
+
+            if stored is not None:
+                stored_fingerprint, response = stored
+
+                if stored_fingerprint != fingerprint:
+                    raise KeyReused()
+
+                return response
+
+            self.__in_flight[key] = fingerprint
+            return None
+
+    def finish(self, key, response):
+        """
+        Stores the StoredResponse for `key`. With None, the request is
+        forgotten so it can be tried again.
+        """
+        with self.__lock:
+            fingerprint = self.__in_flight.pop(key)
+
+            if response is None:
+                return
+
+            expires = time.time() + self.__expiry_seconds
+            self.__responses.put(key, (expires, fingerprint, response))
+
+            if self.__connection is not None:
+                with self.__connection:
+                    self.__connection.execute(
+                        'DELETE FROM responses WHERE expires < ?',
+                        (time.time(),)
+                    )
+                    self.__connection.execute(
+                        'INSERT OR REPLACE INTO responses '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (key, fingerprint) + tuple(response) + (expires,)
+                    )
+
+    def __lookup(self, key):
+        """
+        Returns (fingerprint, StoredResponse) for an unexpired key, or None.
+        """
+        now = time.time()
+        stored = self.__responses.get(key)
+
+        if stored is not None:
+            expires, fingerprint, response = stored
+            return (fingerprint, response) if expires > now else None
+
+        if self.__connection is None:
+            return None
+
+        row = self.__connection.execute(
+            'SELECT fingerprint, status, mimetype, body, expires '
+            'FROM responses WHERE key = ? AND expires > ?',
+            (key, now)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        fingerprint, status, mimetype, body, expires = row
+        response = StoredResponse(status, mimetype, body)
+        self.__responses.put(key, (expires, fingerprint, response))
+        return fingerprint, response
@@ -0,0 +1,132 @@
+import struct
+
+from collections import namedtuple
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import load_der_public_key
+
+from cache import LRUCache
+
+
+LogRootV1 = namedtuple('LogRootV1', [
+    'version', 'tree_size', 'root_hash', 'timestamp_nanos', 'revision',
+    'metadata'
+])
+
+_VERSION = struct.Struct('>H')
+_TREE_SIZE = struct.Struct('>QB')
+_TIMESTAMP_AND_REVISION = struct.Struct('>QQH')
+
+
+class SignatureError(ValueError):
+    pass
+
+
+def decode_log_root(log_root):
+    """
+    Decodes the TLS-encoded LogRoot held in SignedLogRoot.log_root, described
+    in trillian.proto. Only version 1 is supported.
+    """
+    try:
+        version, = _VERSION.unpack_from(log_root, 0)
+
+        if version != 1:
+            raise ValueError('Unsupported LogRoot version {}'.format(version))
+
+        offset = _VERSION.size
+        tree_size, hash_length = _TREE_SIZE.unpack_from(log_root, offset)
+        offset += _TREE_SIZE.size
+
+        root_hash = log_root[offset:offset + hash_length]
+        offset += hash_length
+
+        timestamp_nanos, revision, metadata_length = (
+            _TIMESTAMP_AND_REVISION.unpack_from(log_root, offset)
+        )
+        offset += _TIMESTAMP_AND_REVISION.size
+
+        metadata = log_root[offset:offset + metadata_length]
+        offset += metadata_length
+    except struct.error:
+        raise ValueError('LogRoot is truncated')
+
+    if offset != len(log_root) or len(metadata) != metadata_length:
+        raise ValueError('LogRoot has the wrong length')
+
+    return LogRootV1(
+        version, tree_size, root_hash, timestamp_nanos, revision, metadata
+    )
+
+
+class LogRootVerifier():
+    """
+    Checks the signature on SignedLogRoot messages against their log's public
+    key, and decodes their LogRoot.
+
+    Parsed keys are kept per log, and each distinct (log_root, signature) is
+    only verified and decoded once, so seeing the same root again costs a dict
+    lookup.
+    """
+
+    def __init__(self, get_public_key_der, check_signatures=True,
+                 max_logs=1000, max_verified_roots=10000):
+        """
+        `get_public_key_der(log_id)` returns the DER-encoded public key for a
+        log, eg from the admin API's GetTree.
+
+        With `check_signatures` off, roots are only decoded.
+        """
+        self.__get_public_key_der = get_public_key_der
+        self.__check_signatures = check_signatures
+        self.__public_keys = LRUCache(max_logs)
+        self.__verified = LRUCache(max_verified_roots)
+
+    def public_key(self, log_id):
+        def load():
+            public_key = load_der_public_key(
+                self.__get_public_key_der(log_id), backend=default_backend()
+            )
+
+            if not isinstance(public_key, ec.EllipticCurvePublicKey):
+                raise SignatureError(
+                    'Log {} does not have an ECDSA public key'.format(log_id)
+                )
+
+            return public_key
+
+        return self.__public_keys.get_or_compute(log_id, load)
+
+    def verify(self, log_id, signed_log_root):
+        """
+        Returns the decoded LogRootV1 from `signed_log_root`. Raises
+        SignatureError if it wasn't signed by the log, or ValueError if it
+        can't be decoded.
+        """
+        key = (
+            log_id, signed_log_root.log_root,
+            signed_log_root.log_root_signature
+        )
+        log_root = self.__verified.get(key)
+
+        if log_root is not None:
+            return log_root
+
+        if self.__check_signatures:
+            try:
+                self.public_key(log_id).verify(
+                    signed_log_root.log_root_signature,
+                    signed_log_root.log_root,
+                    ec.ECDSA(hashes.SHA256())
+                )
+            except InvalidSignature:
+                raise SignatureError(
+                    'Signed log root for log {} has an invalid '
+                    'signature'.format(log_id)
+                )
+
+        log_root = decode_log_root(signed_log_root.log_root)
+        self.__verified.put(key, log_root)
+        return log_root
@@ -0,0 +1,257 @@
+"""
+RFC 6962 Merkle tree hashing and proof verification, as used by Trillian's
+RFC6962_SHA256 hash strategy:
+https://tools.ietf.org/html/rfc6962#section-2.1
+
+The verification algorithms follow RFC 9162, sections 2.1.3.2 and 2.1.4.2.
+"""
+
+import hashlib
+
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+HASH_SIZE = 32
+
+EMPTY_ROOT = hashlib.sha256(b'').digest()
+
+# hashlib only releases the GIL while hashing inputs longer than this, so
+# there's no point spreading smaller leaves across threads.
+GIL_RELEASE_BYTES = 2048
+
+# Batches smaller than this are quicker to hash on the calling thread.
+PARALLEL_MIN_BYTES = 1024 * 1024
+
+_LEAF_HASHER = hashlib.sha256(LEAF_PREFIX)
+_NODE_HASHER = hashlib.sha256(NODE_PREFIX)
+
+
+class VerificationError(ValueError):
+    pass
+
+
+def leaf_hash(leaf_value):
+    hasher = _LEAF_HASHER.copy()
+    hasher.update(leaf_value)
+    return hasher.digest()
+
+
+def node_hash(left, right):
+    hasher = _NODE_HASHER.copy()
+    hasher.update(left)
+    hasher.update(right)
+    return hasher.digest()
+
+
+def leaf_hashes(leaf_values, executor=None, chunk_size=256):
+    """
+    Hashes many leaves at once, in order.
+
+    If an `executor` is given and the batch is made of large leaves, it's split
+    into chunks of `chunk_size` which are hashed concurrently.
+    """
+    leaf_values = list(leaf_values)
+
+    if executor is None or not _worth_parallelising(leaf_values):
+        return [leaf_hash(value) for value in leaf_values]
+
+    chunks = [
+        leaf_values[i:i + chunk_size]
+        for i in range(0, len(leaf_values), chunk_size)
+    ]
+
+    return [
+        h for chunk in executor.map(_leaf_hashes_serial, chunks) for h in chunk
+    ]
+
+
+def _leaf_hashes_serial(leaf_values):
+    return [leaf_hash(value) for value in leaf_values]
+
+
+def _worth_parallelising(leaf_values):
+    total_bytes = sum(len(value) for value in leaf_values)
+
+    return (
+        total_bytes >= PARALLEL_MIN_BYTES and
+        total_bytes // len(leaf_values) >= GIL_RELEASE_BYTES
+    )
+
+
+def root_from_leaf_hashes(hashes):
+    """
+    Computes the Merkle Tree Hash of a list of leaf hashes: the root of the
+    whole tree if given every leaf, or of a subtree if given a range.
+    """
+    compact_range = CompactRange()
+
+    for h in hashes:
+        compact_range.append(h)
+
+    return compact_range.root_hash()
+
+
+class CompactRange():
+    """
+    The frontier of a Merkle tree of `size` leaves: the roots of its complete
+    subtrees, largest first, one for each bit set in `size`.
+
+    That's enough to append leaves, at an amortized cost of one node hash
+    each, and to compute the root hash, without keeping the leaves.
+    """
+
+    def __init__(self, size=0, hashes=()):
+        hashes = list(hashes)
+
+        if len(hashes) != bin(size).count('1'):
+            raise ValueError(
+                'A tree of {} leaves has {} subtrees in its frontier, '
+                'not {}'.format(size, bin(size).count('1'), len(hashes))
+            )
+
+        self.size = size
+        self.hashes = hashes
+
+    def append(self, leaf_hash):
+        h = leaf_hash
+
+        # Each trailing one bit of the old size is a subtree the same size as
+        # the one being added, so they merge.
+        size = self.size
+
+        while size & 1:
+            h = node_hash(self.hashes.pop(), h)
+            size >>= 1
+
+        self.hashes.append(h)
+        self.size += 1
+
+    def root_hash(self):
+        if not self.hashes:
+            return EMPTY_ROOT
+
+        root = self.hashes[-1]
+
+        for h in reversed(self.hashes[:-1]):
+            root = node_hash(h, root)
+
+        return root
+
+
+def root_from_inclusion_proof(leaf_index, tree_size, leaf_hash, proof):
+    """
+    Returns the root hash implied by an inclusion proof (audit path), or raises
+    VerificationError if the proof is the wrong shape for the tree.
+    """
+    if not 0 <= leaf_index < tree_size:
+        raise VerificationError(
+            'leaf_index {} is outside tree of size {}'.format(
+                leaf_index, tree_size)
+        )
+
+    fn, sn = leaf_index, tree_size - 1
+    root = leaf_hash
+
+    for p in proof:
+        if sn == 0:
+            raise VerificationError('Inclusion proof is too long')
+
+        if fn & 1 or fn == sn:
+            root = node_hash(p, root)
+
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            root = node_hash(root, p)
+
+        fn >>= 1
+        sn >>= 1
+
+    if sn != 0:
+        raise VerificationError('Inclusion proof is too short')
+
+    return root
+
+
+def verify_inclusion(leaf_index, tree_size, leaf_hash, proof, root_hash):
+    calculated = root_from_inclusion_proof(
+        leaf_index, tree_size, leaf_hash, proof
+    )
+
+    if calculated != root_hash:
+        raise VerificationError(
+            'Inclusion proof does not lead to the expected root hash'
+        )
+
+
+def verify_consistency(first_tree_size, second_tree_size, first_root_hash,
+                       second_root_hash, proof):
+    """
+    Checks that the tree of `first_tree_size` is a prefix of the tree of
+    `second_tree_size`, raising VerificationError if not.
+    """
+    if not 0 <= first_tree_size <= second_tree_size:
+        raise VerificationError(
+            'Need 0 <= first_tree_size <= second_tree_size'
+        )
+
+    if first_tree_size == second_tree_size:
+        if proof:
+            raise VerificationError('Proof must be empty for equal trees')
+
+        if first_root_hash != second_root_hash:
+            raise VerificationError('Root hashes of equal trees differ')
+
+        return
+
+    if first_tree_size == 0:
+        if proof:
+            raise VerificationError('Proof must be empty from an empty tree')
+
+        return
+
+    if not proof:
+        raise VerificationError('Consistency proof is empty')
+
+    proof = list(proof)
+
+    if first_tree_size & (first_tree_size - 1) == 0:
+        # The first tree is a complete subtree, so its root is the starting
+        # point and isn't included in the proof.
+        proof.insert(0, first_root_hash)
+
+    fn, sn = first_tree_size - 1, second_tree_size - 1
+
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+
+    first_root = second_root = proof[0]
+
+    for p in proof[1:]:
+        if sn == 0:
+            raise VerificationError('Consistency proof is too long')
+
+        if fn & 1 or fn == sn:
+            first_root = node_hash(p, first_root)
+            second_root = node_hash(p, second_root)
+
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            second_root = node_hash(second_root, p)
+
+        fn >>= 1
+        sn >>= 1
+
+    if sn != 0:
+        raise VerificationError('Consistency proof is too short')
+
+    if first_root != first_root_hash:
+        raise VerificationError('Proof does not match first root hash')
+
+    if second_root != second_root_hash:
+        raise VerificationError('Proof does not match second root hash')
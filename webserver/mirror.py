@@ -0,0 +1,303 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from os.path import join as pjoin
+
+import grpc
+
+import trillian_log_api_pb2
+
+
+LOG = logging.getLogger(__name__)
+
+
+class LeafStore():
+    """
+    A local copy of one log's sequenced leaves, in an SQLite database.
+
+    Leaves are only ever appended in index order, so the store always holds
+    the contiguous range [0, size).
+    """
+
+    def __init__(self, path):
+        self.__path = path
+        self.__local = threading.local()
+        self.__write_lock = threading.Lock()
+
+        with self.__connection() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS leaves ('
+                '  leaf_index INTEGER PRIMARY KEY,'
+                '  merkle_leaf_hash BLOB NOT NULL,'
+                '  leaf_value BLOB NOT NULL,'
+                '  extra_data BLOB,'
+                '  leaf_identity_hash BLOB'
+                ')'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS leaves_by_hash '
+                'ON leaves (merkle_leaf_hash)'
+            )
+            last, = connection.execute(
+                'SELECT MAX(leaf_index) FROM leaves'
+            ).fetchone()
+
+        self.__size = 0 if last is None else last + 1
+
+    def __connection(self):
+        """
+        SQLite connections can't be shared between threads, so each thread
+        gets its own.
+        """
+        connection = getattr(self.__local, 'connection', None)
+
+        if connection is None:
+            connection = self.__local.connection = sqlite3.connect(
+                self.__path
+            )
+
+        return connection
+
+    @property
+    def size(self):
+        return self.__size
+
+    def append(self, leaves):
+        """
+        Adds leaves, which must be sorted and start at the current size.
+        """
+        with self.__write_lock:
+            for expected, leaf in enumerate(leaves, self.__size):
+                if leaf.leaf_index != expected:
+                    raise ValueError(
+                        'Expected leaf {}, got {}'.format(
+                            expected, leaf.leaf_index)
+                    )
+
+            with self.__connection() as connection:
+                connection.executemany(
+                    'INSERT INTO leaves VALUES (?, ?, ?, ?, ?)',
+                    [
+                        (
+                            leaf.leaf_index, leaf.merkle_leaf_hash,
+                            leaf.leaf_value, leaf.extra_data,
+                            leaf.leaf_identity_hash
+                        ) for leaf in leaves
+                    ]
+                )
+
+            self.__size += len(leaves)
+
+    def get_leaves(self, start, end):
+        """
+        Returns LogLeaf messages for [start, end), which must be within the
+        store.
+        """
+        if not 0 <= start <= end <= self.__size:
+            raise ValueError(
+                '[{}, {}) is not within the mirrored range [0, {})'.format(
+                    start, end, self.__size)
+            )
+
+        rows = self.__connection().execute(
+            'SELECT * FROM leaves WHERE leaf_index >= ? AND leaf_index < ? '
+            'ORDER BY leaf_index',
+            (start, end)
+        )
+
+        return [to_log_leaf(row) for row in rows]
+
+    def get_leaves_by_hash(self, merkle_leaf_hash):
+        """
+        Returns the LogLeaf messages with `merkle_leaf_hash`, in index order,
+        found through an index rather than scanning the log.
+        """
+        rows = self.__connection().execute(
+            'SELECT * FROM leaves WHERE merkle_leaf_hash = ? '
+            'ORDER BY leaf_index',
+            (merkle_leaf_hash,)
+        )
+
+        return [to_log_leaf(row) for row in rows]
+
+
+def to_log_leaf(row):
+    leaf_index, merkle_leaf_hash, leaf_value, extra_data, identity_hash = row
+
+    return trillian_log_api_pb2.LogLeaf(
+        leaf_index=leaf_index,
+        merkle_leaf_hash=merkle_leaf_hash,
+        leaf_value=leaf_value,
+        extra_data=extra_data or b'',
+        leaf_identity_hash=identity_hash or b'',
+    )
+
+
+class LeafMirror():
+    """
+    Tails the sequenced leaves of every log into a LeafStore, so reads of
+    leaves below the mirrored size can be served without Trillian.
+
+    `make_log_client(log_id)` and `list_log_ids()` give the mirror its access
+    to Trillian. `check_root(log_id, signed_log_root)` returns the decoded
+    LogRootV1 of each root the mirror fetches, or raises ValueError if it
+    shouldn't be trusted, in which case the log isn't synced.
+
+    Followers are kept up to date with every mirrored leaf. They're objects
+    with `size(log_id)`, saying how many leaves they've seen, and
+    `append(log_id, leaves)`. A follower which is behind the store, eg after
+    a restart, is caught up from the store before any new leaves are fetched.
+    """
+
+    def __init__(self, directory, make_log_client, list_log_ids, check_root,
+                 poll_seconds=10, batch_size=1024, followers=()):
+        os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__make_log_client = make_log_client
+        self.__list_log_ids = list_log_ids
+        self.__check_root = check_root
+        self.__poll_seconds = poll_seconds
+        self.__batch_size = batch_size
+        self.__followers = list(followers)
+        self.__stores = {}
+        self.__tree_sizes = {}
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__stopped = threading.Event()
+
+    def __path(self, log_id):
+        return pjoin(self.__directory, '{}.sqlite'.format(log_id))
+
+    def __open_store(self, log_id):
+        """
+        The log's store, created if it doesn't exist yet. Only used when
+        syncing logs which Trillian has listed.
+        """
+        with self.__lock:
+            if log_id not in self.__stores:
+                self.__stores[log_id] = LeafStore(self.__path(log_id))
+
+            return self.__stores[log_id]
+
+    def store(self, log_id):
+        """
+        The log's store, or None if the log hasn't been mirrored.
+        """
+        with self.__lock:
+            if log_id not in self.__stores:
+                if not os.path.exists(self.__path(log_id)):
+                    return None
+
+                self.__stores[log_id] = LeafStore(self.__path(log_id))
+
+            return self.__stores[log_id]
+
+    def size(self, log_id):
+        """
+        How many leaves of the log have been mirrored so far.
+        """
+        store = self.store(log_id)
+        return store.size if store is not None else 0
+
+    def tree_size(self, log_id):
+        """
+        The log's tree size when the mirror last checked it, or None if it
+        hasn't yet.
+        """
+        return self.__tree_sizes.get(log_id)
+
+    def get_leaves(self, log_id, start, end):
+        """
+        Returns the leaves [start, end) if they've all been mirrored,
+        otherwise None.
+        """
+        store = self.store(log_id)
+
+        if store is None or end > store.size:
+            return None
+
+        return store.get_leaves(start, end)
+
+    def get_leaves_by_hash(self, log_id, merkle_leaf_hash):
+        """
+        Returns the mirrored leaves with `merkle_leaf_hash`. Leaves beyond the
+        mirrored size won't be found.
+        """
+        store = self.store(log_id)
+
+        if store is None:
+            return []
+
+        return store.get_leaves_by_hash(merkle_leaf_hash)
+
+    def start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(
+                target=self.__run, name='leaf-mirror', daemon=True
+            )
+            self.__thread.start()
+
+    def stop(self):
+        self.__stopped.set()
+
+    def __run(self):
+        while not self.__stopped.is_set():
+            try:
+                self.sync_all()
+            except Exception:
+                LOG.exception('Failed to mirror logs')
+
+            self.__stopped.wait(self.__poll_seconds)
+
+    def sync_all(self):
+        for log_id in self.__list_log_ids():
+            try:
+                self.sync(log_id)
+            except grpc.RpcError as e:
+                LOG.warning('Failed to mirror log %s: %s', log_id, e)
+            except Exception:
+                # Eg a follower which can't take the leaves; the other logs
+                # can still be mirrored.
+                LOG.exception('Failed to mirror log %s', log_id)
+
+    def sync(self, log_id):
+        """
+        Copies any newly sequenced leaves of one log into its store.
+        """
+        log_client = self.__make_log_client(log_id)
+        store = self.__open_store(log_id)
+
+        for follower in self.__followers:
+            self.__catch_up(follower, log_id, store)
+
+        # Checked after catching up the followers, so a root for the tree
+        # they already hold is compared with it straight away.
+        log_root = self.__check_root(
+            log_id, log_client.get_signed_log_root()
+        )
+        tree_size = self.__tree_sizes[log_id] = log_root.tree_size
+
+        while store.size < tree_size:
+            end = min(store.size + self.__batch_size, tree_size)
+            leaves = sorted(
+                log_client.get_leaves_by_index(range(store.size, end)),
+                key=lambda leaf: leaf.leaf_index
+            )
+
+            if not leaves:
+                break
+
+            store.append(leaves)
+
+            for follower in self.__followers:
+                follower.append(log_id, leaves)
+
+    def __catch_up(self, follower, log_id, store):
+        while follower.size(log_id) < store.size:
+            start = follower.size(log_id)
+            end = min(start + self.__batch_size, store.size)
+            follower.append(log_id, store.get_leaves(start, end))
@@ -0,0 +1,143 @@
+import logging
+import math
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+LOG = logging.getLogger(__name__)
+
+
+class BackendOverloaded(Exception):
+    """
+    Raised instead of making a backend call when Trillian is already
+    struggling, so the caller can fail fast rather than queue up behind it.
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class CircuitBreaker():
+    """
+    Stops calls to a failing backend.
+
+    After `max_failures` consecutive failures the breaker opens and every call
+    is refused for `reset_seconds`. Then a single trial call is let through:
+    if it succeeds the breaker closes, otherwise it opens again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, max_failures=5, reset_seconds=10):
+        self.name = name
+        self.__max_failures = max_failures
+        self.__reset_seconds = reset_seconds
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def state(self):
+        return self.__state
+
+    def before_call(self):
+        with self.__lock:
+            if self.__state == self.CLOSED:
+                return
+
+            remaining = self.__opened_at + self.__reset_seconds - (
+                time.monotonic())
+
+            if self.__state == self.OPEN and remaining <= 0:
+                self.__state = self.HALF_OPEN
+                return
+
+            raise BackendOverloaded(
+                'Circuit breaker for {} calls is open'.format(self.name),
+                retry_after=max(remaining, 1)
+            )
+
+    def record(self, failed):
+        with self.__lock:
+            if not failed:
+                self.__state = self.CLOSED
+                self.__failures = 0
+                return
+
+            self.__failures += 1
+
+            if (self.__state == self.HALF_OPEN or
+                    self.__failures >= self.__max_failures):
+                if self.__state != self.OPEN:
+                    LOG.warning('Opening circuit breaker for %s calls',
+                                self.name)
+
+                self.__state = self.OPEN
+                self.__opened_at = time.monotonic()
+
+
+class BackendGuard():
+    """
+    Admission control for backend calls: caps how many can be in flight at
+    once, and keeps a CircuitBreaker for each class of RPC.
+    """
+
+    def __init__(self, max_in_flight=32, max_failures=5, reset_seconds=10,
+                 retry_after=1):
+        self.__slots = threading.BoundedSemaphore(max_in_flight)
+        self.__max_failures = max_failures
+        self.__reset_seconds = reset_seconds
+        self.__retry_after = retry_after
+        self.__breakers = {}
+        self.__lock = threading.Lock()
+
+    def breaker(self, rpc_class):
+        with self.__lock:
+            if rpc_class not in self.__breakers:
+                self.__breakers[rpc_class] = CircuitBreaker(
+                    rpc_class,
+                    max_failures=self.__max_failures,
+                    reset_seconds=self.__reset_seconds,
+                )
+
+            return self.__breakers[rpc_class]
+
+    @contextmanager
+    def admit(self, rpc_class, is_failure):
+        """
+        Wraps a backend call, raising BackendOverloaded instead of making it if
+        there's no capacity. `is_failure(exception)` decides which errors
+        count against the circuit breaker.
+        """
+        breaker = self.breaker(rpc_class)
+
+        # Take a slot before asking the breaker, since an open breaker lets
+        # its trial call through from before_call, and a trial turned away
+        # for want of a slot would never be recorded.
+        if not self.__slots.acquire(blocking=False):
+            raise BackendOverloaded(
+                'Too many requests in flight to Trillian',
+                retry_after=self.__retry_after
+            )
+
+        try:
+            breaker.before_call()
+        except BackendOverloaded:
+            self.__slots.release()
+            raise
+
+        try:
+            yield
+        except Exception as e:
+            breaker.record(failed=is_failure(e))
+            raise
+        else:
+            breaker.record(failed=False)
+        finally:
+            self.__slots.release()
@@ -0,0 +1,91 @@
+import threading
+import time
+
+
+class RateLimiter():
+    """
+    Token buckets for any number of keys, all with the same rate and burst.
+
+    Buckets are spread across `shards` dicts, each with its own lock, so
+    requests for different keys rarely contend with each other.
+    """
+
+    MAX_BUCKETS_PER_SHARD = 10000
+
+    def __init__(self, rate, burst, shards=16):
+        if rate <= 0 or burst < 1:
+            raise ValueError('`rate` must be > 0 and `burst` must be >= 1')
+
+        self.__rate = float(rate)
+        self.__burst = float(burst)
+        self.__shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    def available(self, key):
+        """
+        Returns 0 if `key`'s bucket has a token, otherwise the number of
+        seconds until it will, without taking one.
+        """
+        buckets, lock = self.__shards[hash(key) % len(self.__shards)]
+        now = time.monotonic()
+
+        with lock:
+            bucket = buckets.get(key)
+
+            if bucket is None:
+                return 0
+
+            tokens, updated = bucket
+            tokens = min(self.__burst, tokens + (now - updated) * self.__rate)
+
+            return 0 if tokens >= 1 else (1 - tokens) / self.__rate
+
+    def refund(self, key):
+        """
+        Puts back a token taken by `acquire`, for a request which was turned
+        away after all.
+        """
+        buckets, lock = self.__shards[hash(key) % len(self.__shards)]
+
+        with lock:
+            bucket = buckets.get(key)
+
+            if bucket is not None:
+                bucket[0] = min(self.__burst, bucket[0] + 1)
+
+    def acquire(self, key):
+        """
+        Takes a token from `key`'s bucket. Returns 0 if one was available,
+        otherwise the number of seconds until there will be one.
+        """
+        buckets, lock = self.__shards[hash(key) % len(self.__shards)]
+        now = time.monotonic()
+
+        with lock:
+            bucket = buckets.get(key)
+
+            if bucket is None:
+                if len(buckets) >= self.MAX_BUCKETS_PER_SHARD:
+                    self.__evict_full(buckets, now)
+
+                bucket = buckets[key] = [self.__burst, now]
+
+            tokens, updated = bucket
+            tokens = min(self.__burst, tokens + (now - updated) * self.__rate)
+
+            if tokens >= 1:
+                bucket[:] = [tokens - 1, now]
+                return 0
+
+            bucket[:] = [tokens, now]
+            return (1 - tokens) / self.__rate
+
+    def __evict_full(self, buckets, now):
+        """
+        Forgets buckets which have refilled completely: recreating them later
+        gives exactly the same result.
+        """
+        refill_seconds = self.__burst / self.__rate
+
+        for key, (tokens, updated) in list(buckets.items()):
+            if now - updated >= refill_seconds:
+                del buckets[key]
@@ -0,0 +1,173 @@
+import mmap
+import os
+import struct
+import threading
+
+from os.path import join as pjoin
+
+import trillian_pb2
+
+
+class RootHistory():
+    """
+    Keeps every signed log root we've seen for each log, on disk, so the root
+    at or before a given tree size or time can be looked up later.
+
+    Each log has a directory holding two append-only files:
+
+    * `roots`: serialized SignedLogRoot messages, one after another
+    * `index`: a fixed-width record for each root, in the order they were
+      seen, giving its tree size, timestamp and position in `roots`
+
+    Roots are only recorded if they're newer than the last one, so the index
+    is sorted by both tree size and timestamp and can be binary searched
+    through an mmap of the file.
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__logs = {}
+        self.__lock = threading.Lock()
+
+    def __log(self, log_id, create):
+        """
+        The log's history, or None if nothing has been recorded for it and
+        `create` is false.
+        """
+        directory = pjoin(self.__directory, str(log_id))
+
+        with self.__lock:
+            if log_id not in self.__logs:
+                if not create and not os.path.isdir(directory):
+                    return None
+
+                self.__logs[log_id] = _LogRootHistory(directory)
+
+            return self.__logs[log_id]
+
+    def record(self, log_id, signed_log_root, log_root):
+        """
+        Adds a verified root, given with its decoded LogRootV1, unless it's no
+        newer than the last one recorded.
+        """
+        self.__log(log_id, create=True).append(signed_log_root, log_root)
+
+    def at_or_before(self, log_id, tree_size=None, timestamp_nanos=None):
+        """
+        Returns the latest SignedLogRoot with a tree size (or timestamp) at or
+        before the one given, or None if there isn't one.
+        """
+        history = self.__log(log_id, create=False)
+
+        if history is None:
+            return None
+
+        return history.find(tree_size, timestamp_nanos)
+
+
+class _LogRootHistory():
+    RECORD = struct.Struct('>QQQI4x')  # tree_size, timestamp, offset, length
+
+    TREE_SIZE = 0
+    TIMESTAMP = 1
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+
+        self.__lock = threading.Lock()
+        self.__roots = open(pjoin(directory, 'roots'), 'a+b')
+        self.__index = open(pjoin(directory, 'index'), 'a+b')
+        self.__map = None
+        self.__count = 0
+        self.__last = None
+
+        self.__recover()
+
+    def __recover(self):
+        """
+        Drops anything left over from a write that was interrupted part way.
+        """
+        index_size = os.fstat(self.__index.fileno()).st_size
+        self.__count = index_size // self.RECORD.size
+        self.__index.truncate(self.__count * self.RECORD.size)
+        self.__remap()
+
+        roots_end = 0
+
+        if self.__count:
+            self.__last = self.__record(self.__count - 1)
+            roots_end = self.__last[2] + self.__last[3]
+
+        self.__roots.truncate(roots_end)
+
+    def __remap(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+
+        if self.__count:
+            self.__map = mmap.mmap(
+                self.__index.fileno(), self.__count * self.RECORD.size,
+                access=mmap.ACCESS_READ
+            )
+
+    def __record(self, position):
+        return self.RECORD.unpack_from(
+            self.__map, position * self.RECORD.size
+        )
+
+    def append(self, signed_log_root, log_root):
+        with self.__lock:
+            if self.__last is not None and (
+                    log_root.tree_size < self.__last[0] or
+                    log_root.timestamp_nanos <= self.__last[1]):
+                return
+
+            serialized = signed_log_root.SerializeToString()
+            offset = self.__roots.seek(0, os.SEEK_END)
+            self.__roots.write(serialized)
+            self.__roots.flush()
+
+            record = (
+                log_root.tree_size, log_root.timestamp_nanos, offset,
+                len(serialized)
+            )
+            self.__index.write(self.RECORD.pack(*record))
+            self.__index.flush()
+
+            self.__count += 1
+            self.__last = record
+            self.__remap()
+
+    def find(self, tree_size=None, timestamp_nanos=None):
+        if (tree_size is None) == (timestamp_nanos is None):
+            raise ValueError('Pass one of `tree_size` or `timestamp_nanos`')
+
+        field, value = (
+            (self.TREE_SIZE, tree_size) if tree_size is not None
+            else (self.TIMESTAMP, timestamp_nanos)
+        )
+
+        with self.__lock:
+            # Find the first record with a larger value; the one before it is
+            # the answer.
+            low, high = 0, self.__count
+
+            while low < high:
+                middle = (low + high) // 2
+
+                if self.__record(middle)[field] <= value:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            if low == 0:
+                return None
+
+            _, _, offset, length = self.__record(low - 1)
+            self.__roots.seek(offset)
+            serialized = self.__roots.read(length)
+
+        signed_log_root = trillian_pb2.SignedLogRoot()
+        signed_log_root.ParseFromString(serialized)
+        return signed_log_root
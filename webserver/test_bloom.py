@@ -0,0 +1,175 @@
+"""
+Tests for bloom.py:
+
+    python3 -m unittest test_bloom
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from collections import namedtuple
+from os.path import join as pjoin
+
+from bloom import LeafBlooms, ScalableBloomFilter, _Stage
+
+
+Leaf = namedtuple('Leaf', ['leaf_index', 'merkle_leaf_hash'])
+
+
+def random_hashes(rng, count):
+    return [bytes(rng.getrandbits(8) for _ in range(32)) for _ in range(count)]
+
+
+class TestScalableBloomFilter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        self.rng = random.Random(0)
+        self.items = random_hashes(self.rng, 1000)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def stage_path(self, number):
+        return pjoin(self.path, 'stage-{:02d}'.format(number))
+
+    def test_contains_added_items(self):
+        bloom_filter = ScalableBloomFilter(self.path, 100, 0.01)
+        bloom_filter.add_all(self.items)
+
+        self.assertEqual(bloom_filter.size, len(self.items))
+        self.assertTrue(all(item in bloom_filter for item in self.items))
+
+    def test_false_positive_rate(self):
+        bloom_filter = ScalableBloomFilter(self.path, 100, 0.01)
+        bloom_filter.add_all(self.items)
+
+        others = random_hashes(self.rng, 20000)
+        false_positives = sum(item in bloom_filter for item in others)
+
+        self.assertLess(false_positives / len(others), 0.015)
+
+    def test_grows_in_stages(self):
+        ScalableBloomFilter(self.path, 100, 0.01).add_all(self.items)
+
+        # 100 + 200 + 400 < 1000 <= 100 + 200 + 400 + 800
+        self.assertEqual(
+            sorted(os.listdir(self.path)),
+            ['stage-00', 'stage-01', 'stage-02', 'stage-03']
+        )
+
+    def test_reopen(self):
+        ScalableBloomFilter(self.path, 100, 0.01).add_all(self.items[:500])
+
+        bloom_filter = ScalableBloomFilter(self.path, 100, 0.01)
+        self.assertEqual(bloom_filter.size, 500)
+
+        bloom_filter.add_all(self.items[500:])
+        self.assertEqual(bloom_filter.size, len(self.items))
+        self.assertTrue(all(item in bloom_filter for item in self.items))
+
+    def test_reopen_with_new_settings(self):
+        """
+        Existing stages keep the parameters they were created with.
+        """
+        ScalableBloomFilter(self.path, 100, 0.01).add_all(self.items[:500])
+
+        bloom_filter = ScalableBloomFilter(self.path, 1000, 0.001)
+        self.assertEqual(bloom_filter.size, 500)
+        self.assertTrue(all(item in bloom_filter for item in self.items[:500]))
+
+        bloom_filter.add_all(self.items[500:])
+        self.assertTrue(all(item in bloom_filter for item in self.items))
+
+    def test_recovers_unsaved_count(self):
+        """
+        After a crash before the count was saved, the filter reports fewer
+        items, which are added again.
+        """
+        ScalableBloomFilter(self.path, 2000, 0.01).add_all(self.items)
+
+        with open(self.stage_path(0), 'r+b') as f:
+            header = _Stage.HEADER.unpack(f.read(_Stage.HEADER.size))
+            f.seek(0)
+            f.write(_Stage.HEADER.pack(*header[:-1], 600))
+
+        bloom_filter = ScalableBloomFilter(self.path, 2000, 0.01)
+        self.assertEqual(bloom_filter.size, 600)
+
+        bloom_filter.add_all(self.items[600:])
+        self.assertEqual(bloom_filter.size, len(self.items))
+        self.assertTrue(all(item in bloom_filter for item in self.items))
+
+    def test_recovers_stage_being_created(self):
+        """
+        A stage file left empty, with part of a header, or without its bits
+        by a crash is created again.
+        """
+        header_only = _Stage.HEADER.pack(_Stage.MAGIC, 7, 200, 1917, 0)
+
+        for contents in [b'', header_only[:10], header_only]:
+            with self.subTest(contents=contents), \
+                    tempfile.TemporaryDirectory() as path:
+                # Fills the first stage exactly, so the next one isn't made
+                ScalableBloomFilter(path, 100, 0.01).add_all(self.items[:100])
+
+                with open(pjoin(path, 'stage-01'), 'wb') as f:
+                    f.write(contents)
+
+                bloom_filter = ScalableBloomFilter(path, 100, 0.01)
+                self.assertEqual(bloom_filter.size, 100)
+
+                bloom_filter.add_all(self.items[100:300])
+                self.assertEqual(bloom_filter.size, 300)
+                self.assertTrue(
+                    all(item in bloom_filter for item in self.items[:300])
+                )
+
+    def test_refuses_other_files(self):
+        with open(self.stage_path(0), 'wb') as f:
+            f.write(b'not a Bloom filter stage at all, honest')
+
+        with self.assertRaises(ValueError):
+            ScalableBloomFilter(self.path, 100, 0.01)
+
+    def test_refuses_truncated_stage(self):
+        ScalableBloomFilter(self.path, 100, 0.01).add_all(self.items[:50])
+
+        with open(self.stage_path(0), 'r+b') as f:
+            f.truncate(_Stage.HEADER.size + 10)
+
+        with self.assertRaises(ValueError):
+            ScalableBloomFilter(self.path, 100, 0.01)
+
+
+class TestLeafBlooms(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.blooms = LeafBlooms(self.directory.name, initial_capacity=100)
+        self.hashes = random_hashes(random.Random(0), 10)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_unknown_log(self):
+        self.assertEqual(self.blooms.size(1), 0)
+        self.assertTrue(self.blooms.might_contain(1, self.hashes[0]))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_append(self):
+        self.blooms.append(1, [
+            Leaf(i, leaf_hash) for i, leaf_hash in enumerate(self.hashes[:5])
+        ])
+
+        self.assertEqual(self.blooms.size(1), 5)
+        self.assertTrue(self.blooms.might_contain(1, self.hashes[0]))
+        self.assertFalse(self.blooms.might_contain(1, self.hashes[9]))
+
+        with self.assertRaises(ValueError):
+            self.blooms.append(1, [Leaf(6, self.hashes[6])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests for frontier.py:
+
+    python3 -m unittest test_frontier
+"""
+
+import os
+import tempfile
+import unittest
+
+from collections import namedtuple
+from os.path import join as pjoin
+
+import merkle
+
+from frontier import LogFrontiers
+
+
+Leaf = namedtuple('Leaf', ['leaf_index', 'merkle_leaf_hash'])
+LogRoot = namedtuple('LogRoot', ['tree_size', 'root_hash'])
+
+LOG_ID = 1
+WRONG_HASH = b'\x00' * merkle.HASH_SIZE
+
+
+def make_leaves(start, end):
+    return [
+        Leaf(i, merkle.leaf_hash('leaf {}'.format(i).encode('ascii')))
+        for i in range(start, end)
+    ]
+
+
+def root_of(tree_size):
+    return LogRoot(tree_size, merkle.root_from_leaf_hashes(
+        leaf.merkle_leaf_hash for leaf in make_leaves(0, tree_size)
+    ))
+
+
+class TestLogFrontiers(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.frontiers = LogFrontiers(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_root_hash(self):
+        for tree_size in range(1, 70):
+            self.frontiers.append(
+                LOG_ID, make_leaves(tree_size - 1, tree_size)
+            )
+            self.assertEqual(
+                self.frontiers.root_hash(LOG_ID), root_of(tree_size).root_hash
+            )
+
+    def test_check_at_current_size(self):
+        self.frontiers.append(LOG_ID, make_leaves(0, 10))
+
+        self.assertIs(self.frontiers.check(LOG_ID, root_of(10)), True)
+
+        with self.assertLogs('frontier', 'ERROR'):
+            self.assertIs(
+                self.frontiers.check(LOG_ID, LogRoot(10, WRONG_HASH)), False
+            )
+
+    def test_check_smaller_tree(self):
+        self.frontiers.append(LOG_ID, make_leaves(0, 10))
+
+        self.assertIsNone(self.frontiers.check(LOG_ID, LogRoot(5, WRONG_HASH)))
+
+    def test_check_larger_tree_once_mirrored(self):
+        self.frontiers.append(LOG_ID, make_leaves(0, 10))
+
+        self.assertIsNone(self.frontiers.check(LOG_ID, root_of(15)))
+        self.assertIsNone(
+            self.frontiers.check(LOG_ID, LogRoot(20, WRONG_HASH))
+        )
+
+        self.frontiers.append(LOG_ID, make_leaves(10, 15))
+
+        with self.assertLogs('frontier', 'ERROR') as logs:
+            self.frontiers.append(LOG_ID, make_leaves(15, 25))
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('tree size 20', logs.output[0])
+
+    def test_append_out_of_order(self):
+        self.frontiers.append(LOG_ID, make_leaves(0, 3))
+
+        with self.assertRaises(ValueError):
+            self.frontiers.append(LOG_ID, make_leaves(4, 5))
+
+        self.assertEqual(self.frontiers.size(LOG_ID), 3)
+
+    def test_reopen(self):
+        self.frontiers.append(LOG_ID, make_leaves(0, 37))
+
+        reopened = LogFrontiers(self.directory.name)
+        self.assertEqual(reopened.size(LOG_ID), 37)
+
+        reopened.append(LOG_ID, make_leaves(37, 50))
+        self.assertEqual(reopened.root_hash(LOG_ID), root_of(50).root_hash)
+
+    def test_reopen_ignores_unfinished_save(self):
+        """
+        A save interrupted before its rename leaves the last frontier saved.
+        """
+        self.frontiers.append(LOG_ID, make_leaves(0, 37))
+
+        path = pjoin(self.directory.name, str(LOG_ID))
+
+        with open(path + '.tmp', 'wb') as f:
+            f.write(b'\x00\x00')
+
+        reopened = LogFrontiers(self.directory.name)
+        self.assertEqual(reopened.size(LOG_ID), 37)
+        self.assertEqual(reopened.root_hash(LOG_ID), root_of(37).root_hash)
+
+        reopened.append(LOG_ID, make_leaves(37, 38))
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
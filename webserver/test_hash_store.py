@@ -0,0 +1,189 @@
+"""
+Tests for hash_store.py, checking the proofs it builds with merkle.py:
+
+    python3 -m unittest test_hash_store
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from collections import namedtuple
+from os.path import join as pjoin
+
+import merkle
+
+from hash_store import LeafHashStore, LeafHashStores
+
+
+Leaf = namedtuple('Leaf', ['leaf_index', 'merkle_leaf_hash'])
+
+TREE_SIZE = 300
+
+
+def make_leaves(start, end):
+    return [
+        Leaf(i, merkle.leaf_hash('leaf {}'.format(i).encode('ascii')))
+        for i in range(start, end)
+    ]
+
+
+def append_in_batches(store, end, rng):
+    while store.size < end:
+        batch_end = min(end, store.size + rng.randint(1, 40))
+        store.append(make_leaves(store.size, batch_end))
+
+
+class TestLeafHashStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pjoin(self.directory.name, 'log')
+        self.hashes = [
+            leaf.merkle_leaf_hash for leaf in make_leaves(0, TREE_SIZE)
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def build(self):
+        """
+        Appends TREE_SIZE leaves in random batches, reopening the store half
+        way through.
+        """
+        rng = random.Random(0)
+        append_in_batches(LeafHashStore(self.path), TREE_SIZE // 2, rng)
+
+        store = LeafHashStore(self.path)
+        self.assertEqual(store.size, TREE_SIZE // 2)
+        append_in_batches(store, TREE_SIZE, rng)
+        return store
+
+    def test_root_hashes(self):
+        store = self.build()
+
+        self.assertEqual(store.root_hash(0), merkle.EMPTY_ROOT)
+
+        for tree_size in range(1, TREE_SIZE + 1):
+            self.assertEqual(
+                store.root_hash(tree_size),
+                merkle.root_from_leaf_hashes(self.hashes[:tree_size])
+            )
+
+    def test_inclusion_proofs(self):
+        store = self.build()
+
+        for tree_size in range(1, TREE_SIZE + 1):
+            root_hash = store.root_hash(tree_size)
+
+            for leaf_index in range(tree_size):
+                merkle.verify_inclusion(
+                    leaf_index, tree_size, self.hashes[leaf_index],
+                    store.inclusion_proof(leaf_index, tree_size), root_hash
+                )
+
+    def test_consistency_proofs(self):
+        store = self.build()
+        roots = [store.root_hash(size) for size in range(TREE_SIZE + 1)]
+
+        for second in range(1, TREE_SIZE + 1):
+            for first in range(1, second + 1):
+                merkle.verify_consistency(
+                    first, second, roots[first], roots[second],
+                    store.consistency_proof(first, second)
+                )
+
+    def test_subtree_hashes(self):
+        store = self.build()
+        rng = random.Random(1)
+
+        for _ in range(500):
+            start = rng.randrange(TREE_SIZE)
+            end = rng.randint(start + 1, TREE_SIZE)
+
+            self.assertEqual(
+                store.subtree_hash(start, end),
+                merkle.root_from_leaf_hashes(self.hashes[start:end])
+            )
+
+    def test_leaf_hashes(self):
+        store = self.build()
+
+        self.assertEqual(
+            store.leaf_hashes(10, 50), b''.join(self.hashes[10:50])
+        )
+        self.assertEqual(store.leaf_hashes(7, 7), b'')
+
+    def test_out_of_range(self):
+        store = self.build()
+
+        for call in [
+            lambda: store.inclusion_proof(0, TREE_SIZE + 1),
+            lambda: store.inclusion_proof(5, 5),
+            lambda: store.consistency_proof(0, 10),
+            lambda: store.consistency_proof(10, TREE_SIZE + 1),
+            lambda: store.subtree_hash(0, TREE_SIZE + 1),
+            lambda: store.leaf_hashes(0, TREE_SIZE + 1),
+        ]:
+            with self.assertRaises(ValueError):
+                call()
+
+    def test_append_out_of_order(self):
+        store = LeafHashStore(self.path)
+        store.append(make_leaves(0, 3))
+
+        with self.assertRaises(ValueError):
+            store.append(make_leaves(4, 6))
+
+        self.assertEqual(store.size, 3)
+
+    def test_recovers_partial_writes(self):
+        """
+        A hash cut short by a crash is dropped, and parents which weren't
+        written are rebuilt.
+        """
+        store = LeafHashStore(self.path)
+        append_in_batches(store, 100, random.Random(2))
+        del store
+
+        with open(pjoin(self.path, 'level-00'), 'ab') as f:
+            f.write(b'\x01' * 10)
+
+        for name in os.listdir(self.path):
+            if name != 'level-00':
+                os.remove(pjoin(self.path, name))
+
+        store = LeafHashStore(self.path)
+        self.assertEqual(store.size, 100)
+        self.assertEqual(
+            store.root_hash(100),
+            merkle.root_from_leaf_hashes(self.hashes[:100])
+        )
+
+        store.append(make_leaves(100, 101))
+        merkle.verify_inclusion(
+            100, 101, self.hashes[100], store.inclusion_proof(100, 101),
+            merkle.root_from_leaf_hashes(self.hashes[:101])
+        )
+
+
+class TestLeafHashStores(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_does_not_create(self):
+        stores = LeafHashStores(self.directory.name)
+
+        self.assertIsNone(stores.get(1))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+        stores.append(1, make_leaves(0, 5))
+        self.assertEqual(stores.get(1).size, 5)
+        self.assertEqual(LeafHashStores(self.directory.name).get(1).size, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
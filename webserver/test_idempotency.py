@@ -0,0 +1,136 @@
+"""
+Tests for idempotency.py:
+
+    python3 -m unittest test_idempotency
+"""
+
+import tempfile
+import unittest
+
+from os.path import join as pjoin
+from unittest import mock
+
+from idempotency import (
+    IdempotencyStore, KeyReused, RequestInFlight, StoredResponse
+)
+
+
+RESPONSE = StoredResponse(200, 'application/json', b'{"leaf_index": 7}')
+
+
+class IdempotencyStoreTests():
+    """
+    Tests for a store, with or without a database, made by `new_store`.
+    """
+
+    def setUp(self):
+        self.now = 1000000.0
+        patcher = mock.patch('idempotency.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.store = self.new_store()
+
+    def test_first_request_goes_ahead(self):
+        self.assertIsNone(self.store.begin('key', 'request'))
+
+    def test_repeats_response(self):
+        self.store.begin('key', 'request')
+        self.store.finish('key', RESPONSE)
+
+        self.assertEqual(self.store.begin('key', 'request'), RESPONSE)
+        self.assertEqual(self.store.begin('key', 'request'), RESPONSE)
+
+    def test_key_reused(self):
+        self.store.begin('key', 'request')
+
+        with self.assertRaises(KeyReused):
+            self.store.begin('key', 'other request')
+
+        self.store.finish('key', RESPONSE)
+
+        with self.assertRaises(KeyReused):
+            self.store.begin('key', 'other request')
+
+    def test_request_in_flight(self):
+        self.store.begin('key', 'request')
+
+        with self.assertRaises(RequestInFlight):
+            self.store.begin('key', 'request')
+
+        self.assertIsNone(self.store.begin('other key', 'request'))
+
+    def test_finish_without_response(self):
+        self.store.begin('key', 'request')
+        self.store.finish('key', None)
+
+        self.assertIsNone(self.store.begin('key', 'other request'))
+
+    def test_expiry(self):
+        self.store.begin('key', 'request')
+        self.store.finish('key', RESPONSE)
+
+        self.now += 59
+        self.assertEqual(self.store.begin('key', 'request'), RESPONSE)
+
+        self.now += 2
+        self.assertIsNone(self.store.begin('key', 'other request'))
+
+
+class TestInMemory(IdempotencyStoreTests, unittest.TestCase):
+    def new_store(self):
+        return IdempotencyStore(expiry_seconds=60)
+
+
+class TestWithDatabase(IdempotencyStoreTests, unittest.TestCase):
+    def new_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = pjoin(directory.name, 'idempotency.sqlite')
+
+        return IdempotencyStore(expiry_seconds=60, path=self.path)
+
+    def reopen(self):
+        return IdempotencyStore(expiry_seconds=60, path=self.path)
+
+    def test_survives_restart(self):
+        self.store.begin('key', 'request')
+        self.store.finish('key', RESPONSE)
+
+        reopened = self.reopen()
+        self.assertEqual(reopened.begin('key', 'request'), RESPONSE)
+
+        with self.assertRaises(KeyReused):
+            reopened.begin('key', 'other request')
+
+    def test_unfinished_request_after_restart(self):
+        """
+        A request which was in flight when the process stopped can be tried
+        again.
+        """
+        self.store.begin('key', 'request')
+
+        self.assertIsNone(self.reopen().begin('key', 'request'))
+
+    def test_expiry_after_restart(self):
+        self.store.begin('key', 'request')
+        self.store.finish('key', RESPONSE)
+
+        self.now += 61
+        self.assertIsNone(self.reopen().begin('key', 'other request'))
+
+    def test_expired_rows_deleted(self):
+        self.store.begin('key', 'request')
+        self.store.finish('key', RESPONSE)
+
+        self.now += 61
+        self.store.begin('other key', 'request')
+        self.store.finish('other key', RESPONSE)
+
+        # Only in memory now, which a new store doesn't share
+        self.now -= 61
+        self.assertIsNone(self.reopen().begin('key', 'other request'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Tests for log_root.py:
+
+    python3 -m unittest test_log_root
+"""
+
+import struct
+import unittest
+
+from collections import namedtuple
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import (
+    Encoding, PublicFormat
+)
+
+from log_root import (
+    LogRootV1, LogRootVerifier, SignatureError, decode_log_root
+)
+
+
+SignedLogRoot = namedtuple('SignedLogRoot', ['log_root', 'log_root_signature'])
+
+LOG_ID = 1
+ROOT = LogRootV1(1, 1234, b'\x07' * 32, 1500000000000000000, 42, b'meta')
+
+
+def encode_log_root(log_root):
+    return b''.join([
+        struct.pack('>HQB', log_root.version, log_root.tree_size,
+                    len(log_root.root_hash)),
+        log_root.root_hash,
+        struct.pack('>QQH', log_root.timestamp_nanos, log_root.revision,
+                    len(log_root.metadata)),
+        log_root.metadata,
+    ])
+
+
+class TestDecodeLogRoot(unittest.TestCase):
+    def test_decode(self):
+        self.assertEqual(decode_log_root(encode_log_root(ROOT)), ROOT)
+
+        empty = ROOT._replace(root_hash=b'', metadata=b'')
+        self.assertEqual(decode_log_root(encode_log_root(empty)), empty)
+
+    def test_unsupported_version(self):
+        with self.assertRaises(ValueError):
+            decode_log_root(encode_log_root(ROOT._replace(version=2)))
+
+    def test_wrong_length(self):
+        encoded = encode_log_root(ROOT)
+
+        for log_root in [b'', encoded[:1], encoded[:20], encoded[:-1],
+                         encoded + b'\x00']:
+            with self.subTest(log_root=log_root):
+                with self.assertRaises(ValueError):
+                    decode_log_root(log_root)
+
+
+class TestLogRootVerifier(unittest.TestCase):
+    def setUp(self):
+        self.private_key = ec.generate_private_key(
+            ec.SECP256R1(), default_backend()
+        )
+        self.key_requests = []
+
+    def get_public_key_der(self, log_id):
+        self.key_requests.append(log_id)
+        return self.private_key.public_key().public_bytes(
+            Encoding.DER, PublicFormat.SubjectPublicKeyInfo
+        )
+
+    def sign(self, log_root, private_key=None):
+        encoded = encode_log_root(log_root)
+        signature = (private_key or self.private_key).sign(
+            encoded, ec.ECDSA(hashes.SHA256())
+        )
+        return SignedLogRoot(encoded, signature)
+
+    def test_verify(self):
+        verifier = LogRootVerifier(self.get_public_key_der)
+
+        self.assertEqual(verifier.verify(LOG_ID, self.sign(ROOT)), ROOT)
+
+    def test_verify_once(self):
+        verifier = LogRootVerifier(self.get_public_key_der)
+        signed_log_root = self.sign(ROOT)
+
+        self.assertIs(
+            verifier.verify(LOG_ID, signed_log_root),
+            verifier.verify(LOG_ID, signed_log_root)
+        )
+        verifier.verify(LOG_ID, self.sign(ROOT._replace(tree_size=1235)))
+
+        self.assertEqual(self.key_requests, [LOG_ID])
+
+    def test_invalid_signature(self):
+        verifier = LogRootVerifier(self.get_public_key_der)
+        other_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        signed_log_root = self.sign(ROOT)
+
+        for bad in [
+            self.sign(ROOT, other_key),
+            signed_log_root._replace(
+                log_root=encode_log_root(ROOT._replace(tree_size=1235))
+            ),
+        ]:
+            with self.assertRaises(SignatureError):
+                verifier.verify(LOG_ID, bad)
+
+        # A bad signature isn't remembered as good, nor the other way round
+        self.assertEqual(verifier.verify(LOG_ID, signed_log_root), ROOT)
+
+        with self.assertRaises(SignatureError):
+            verifier.verify(LOG_ID, self.sign(ROOT, other_key))
+
+    def test_without_checking_signatures(self):
+        verifier = LogRootVerifier(
+            self.get_public_key_der, check_signatures=False
+        )
+
+        self.assertEqual(
+            verifier.verify(LOG_ID, SignedLogRoot(encode_log_root(ROOT), b'')),
+            ROOT
+        )
+        self.assertEqual(self.key_requests, [])
+
+    def test_undecodable_root(self):
+        verifier = LogRootVerifier(self.get_public_key_der)
+        log_root = encode_log_root(ROOT) + b'\x00'
+        signature = self.private_key.sign(log_root, ec.ECDSA(hashes.SHA256()))
+
+        with self.assertRaisesRegex(ValueError, 'wrong length'):
+            verifier.verify(LOG_ID, SignedLogRoot(log_root, signature))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+"""
+Tests for merkle.py, against the RFC 6962 test vectors used by Trillian and
+Certificate Transparency:
+
+    python3 -m unittest test_merkle
+"""
+
+import unittest
+
+from binascii import unhexlify
+
+import merkle
+
+from merkle import VerificationError
+
+
+LEAVES = [unhexlify(leaf) for leaf in [
+    '',
+    '00',
+    '10',
+    '2021',
+    '3031',
+    '40414243',
+    '5051525354555657',
+    '606162636465666768696a6b6c6d6e6f',
+]]
+
+LEAF_HASHES = [merkle.leaf_hash(leaf) for leaf in LEAVES]
+
+# The root hash of the tree of the first N leaves, for N = 1..8
+ROOTS = [None] + [unhexlify(root) for root in [
+    '6e340b9cffb37a989ca544e6bb780a2c78901d3fb33738768511a30617afa01d',
+    'fac54203e7cc696cf0dfcb42c92a1d9dbaf70ad9e621f4bd8d98662f00e3c125',
+    'aeb6bcfe274b70a14fb067a5e5578264db0fa9b51af5e0ba159158f329e06e77',
+    'd37ee418976dd95753c1c73862b9398fa2a2cf9b4ff0fdfe8b30cd95209614b7',
+    '4e3bbb1f7b478dcfe71fb631631519a3bca12c9aefca1612bfce4c13a86264d4',
+    '76e67dadbcdf1e10e1b74ddc608abd2f98dfb16fbce75277b5232a127f2087ef',
+    'ddb89be403809e325750d3d263cd78929c2942b7942a34b77e122c9594a74c8c',
+    '5dc9da79a70659a9ad559cb701ded9a2ab9d823aad2f4960cfe370eff4604328',
+]]
+
+# (leaf_index, tree_size, proof)
+INCLUSION_PROOFS = [
+    (0, 1, []),
+    (0, 8, [
+        '96a296d224f285c67bee93c30f8a309157f0daa35dc5b87e410b78630a09cfc7',
+        '5f083f0a1a33ca076a95279832580db3e0ef4584bdff1f54c8a360f50de3031e',
+        '6b47aaf29ee3c2af9af889bc1fb9254dabd31177f16232dd6aab035ca39bf6e4',
+    ]),
+    (5, 8, [
+        'bc1a0643b12e4d2d7c77918f44e0f4f79a838b6cf9ec5b5c283e1f4d88599e6b',
+        'ca854ea128ed050b41b35ffc1b87b8eb2bde461e9e3b5596ece6b9d5975a0ae0',
+        'd37ee418976dd95753c1c73862b9398fa2a2cf9b4ff0fdfe8b30cd95209614b7',
+    ]),
+    (2, 3, [
+        'fac54203e7cc696cf0dfcb42c92a1d9dbaf70ad9e621f4bd8d98662f00e3c125',
+    ]),
+    (1, 5, [
+        '6e340b9cffb37a989ca544e6bb780a2c78901d3fb33738768511a30617afa01d',
+        '5f083f0a1a33ca076a95279832580db3e0ef4584bdff1f54c8a360f50de3031e',
+        'bc1a0643b12e4d2d7c77918f44e0f4f79a838b6cf9ec5b5c283e1f4d88599e6b',
+    ]),
+]
+
+# (first_tree_size, second_tree_size, proof)
+CONSISTENCY_PROOFS = [
+    (1, 1, []),
+    (1, 8, [
+        '96a296d224f285c67bee93c30f8a309157f0daa35dc5b87e410b78630a09cfc7',
+        '5f083f0a1a33ca076a95279832580db3e0ef4584bdff1f54c8a360f50de3031e',
+        '6b47aaf29ee3c2af9af889bc1fb9254dabd31177f16232dd6aab035ca39bf6e4',
+    ]),
+    (6, 8, [
+        '0ebc5d3437fbe2db158b9f126a1d118e308181031d0a949f8dededebc558ef6a',
+        'ca854ea128ed050b41b35ffc1b87b8eb2bde461e9e3b5596ece6b9d5975a0ae0',
+        'd37ee418976dd95753c1c73862b9398fa2a2cf9b4ff0fdfe8b30cd95209614b7',
+    ]),
+    (2, 5, [
+        '5f083f0a1a33ca076a95279832580db3e0ef4584bdff1f54c8a360f50de3031e',
+        'bc1a0643b12e4d2d7c77918f44e0f4f79a838b6cf9ec5b5c283e1f4d88599e6b',
+    ]),
+]
+
+EXTRA_HASH = b'\xff' * merkle.HASH_SIZE
+
+
+def decode(proof):
+    return [unhexlify(node) for node in proof]
+
+
+class TestRootHash(unittest.TestCase):
+    def test_known_roots(self):
+        for tree_size in range(1, len(LEAVES) + 1):
+            self.assertEqual(
+                merkle.root_from_leaf_hashes(LEAF_HASHES[:tree_size]),
+                ROOTS[tree_size]
+            )
+
+    def test_empty_tree(self):
+        self.assertEqual(merkle.root_from_leaf_hashes([]), merkle.EMPTY_ROOT)
+
+
+class TestVerifyInclusion(unittest.TestCase):
+    def test_known_proofs(self):
+        for leaf_index, tree_size, proof in INCLUSION_PROOFS:
+            with self.subTest(leaf_index=leaf_index, tree_size=tree_size):
+                merkle.verify_inclusion(
+                    leaf_index, tree_size, LEAF_HASHES[leaf_index],
+                    decode(proof), ROOTS[tree_size]
+                )
+
+    def test_proof_too_short(self):
+        for leaf_index, tree_size, proof in INCLUSION_PROOFS:
+            if not proof:
+                continue
+
+            with self.subTest(leaf_index=leaf_index, tree_size=tree_size):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_inclusion(
+                        leaf_index, tree_size, LEAF_HASHES[leaf_index],
+                        decode(proof)[:-1], ROOTS[tree_size]
+                    )
+
+    def test_proof_too_long(self):
+        for leaf_index, tree_size, proof in INCLUSION_PROOFS:
+            with self.subTest(leaf_index=leaf_index, tree_size=tree_size):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_inclusion(
+                        leaf_index, tree_size, LEAF_HASHES[leaf_index],
+                        decode(proof) + [EXTRA_HASH], ROOTS[tree_size]
+                    )
+
+    def test_wrong_root(self):
+        for leaf_index, tree_size, proof in INCLUSION_PROOFS:
+            with self.subTest(leaf_index=leaf_index, tree_size=tree_size):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_inclusion(
+                        leaf_index, tree_size, LEAF_HASHES[leaf_index],
+                        decode(proof), EXTRA_HASH
+                    )
+
+    def test_wrong_leaf(self):
+        for leaf_index, tree_size, proof in INCLUSION_PROOFS:
+            with self.subTest(leaf_index=leaf_index, tree_size=tree_size):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_inclusion(
+                        leaf_index, tree_size, EXTRA_HASH, decode(proof),
+                        ROOTS[tree_size]
+                    )
+
+    def test_wrong_leaf_index(self):
+        leaf_index, tree_size, proof = INCLUSION_PROOFS[2]
+
+        with self.assertRaises(VerificationError):
+            merkle.verify_inclusion(
+                leaf_index - 1, tree_size, LEAF_HASHES[leaf_index],
+                decode(proof), ROOTS[tree_size]
+            )
+
+    def test_leaf_index_outside_tree(self):
+        for leaf_index, tree_size in [(-1, 8), (8, 8), (0, 0)]:
+            with self.subTest(leaf_index=leaf_index, tree_size=tree_size):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_inclusion(
+                        leaf_index, tree_size, LEAF_HASHES[0], [],
+                        merkle.EMPTY_ROOT
+                    )
+
+
+class TestVerifyConsistency(unittest.TestCase):
+    def test_known_proofs(self):
+        for first, second, proof in CONSISTENCY_PROOFS:
+            with self.subTest(first=first, second=second):
+                merkle.verify_consistency(
+                    first, second, ROOTS[first], ROOTS[second], decode(proof)
+                )
+
+    def test_from_empty_tree(self):
+        merkle.verify_consistency(0, 8, merkle.EMPTY_ROOT, ROOTS[8], [])
+
+        with self.assertRaises(VerificationError):
+            merkle.verify_consistency(
+                0, 8, merkle.EMPTY_ROOT, ROOTS[8], [EXTRA_HASH]
+            )
+
+    def test_equal_trees(self):
+        with self.assertRaises(VerificationError):
+            merkle.verify_consistency(8, 8, ROOTS[8], ROOTS[8], [EXTRA_HASH])
+
+        with self.assertRaises(VerificationError):
+            merkle.verify_consistency(8, 8, ROOTS[8], ROOTS[7], [])
+
+    def test_proof_too_short(self):
+        for first, second, proof in CONSISTENCY_PROOFS:
+            if first == second:
+                continue
+
+            with self.subTest(first=first, second=second):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_consistency(
+                        first, second, ROOTS[first], ROOTS[second],
+                        decode(proof)[:-1]
+                    )
+
+    def test_proof_too_long(self):
+        for first, second, proof in CONSISTENCY_PROOFS:
+            with self.subTest(first=first, second=second):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_consistency(
+                        first, second, ROOTS[first], ROOTS[second],
+                        decode(proof) + [EXTRA_HASH]
+                    )
+
+    def test_wrong_first_root(self):
+        for first, second, proof in CONSISTENCY_PROOFS:
+            with self.subTest(first=first, second=second):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_consistency(
+                        first, second, EXTRA_HASH, ROOTS[second],
+                        decode(proof)
+                    )
+
+    def test_wrong_second_root(self):
+        for first, second, proof in CONSISTENCY_PROOFS:
+            with self.subTest(first=first, second=second):
+                with self.assertRaises(VerificationError):
+                    merkle.verify_consistency(
+                        first, second, ROOTS[first], EXTRA_HASH,
+                        decode(proof)
+                    )
+
+    def test_tree_sizes_out_of_order(self):
+        with self.assertRaises(VerificationError):
+            merkle.verify_consistency(8, 6, ROOTS[8], ROOTS[6], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
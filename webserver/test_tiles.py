@@ -0,0 +1,177 @@
+"""
+Tests for tiles.py:
+
+    python3 -m unittest test_tiles
+"""
+
+import os
+import tempfile
+import unittest
+
+from collections import namedtuple
+from os.path import join as pjoin
+
+import merkle
+
+from merkle import HASH_SIZE
+from tiles import ENTRY_LENGTH, TILE_WIDTH, TileWriter, tile_path
+
+
+Leaf = namedtuple('Leaf', ['leaf_index', 'leaf_value', 'merkle_leaf_hash'])
+
+LOG_ID = 1
+
+
+def make_leaves(start, end):
+    leaves = []
+
+    for i in range(start, end):
+        value = 'leaf {}'.format(i).encode('ascii')
+        leaves.append(Leaf(i, value, merkle.leaf_hash(value)))
+
+    return leaves
+
+
+def split_hashes(tile):
+    return [tile[i:i + HASH_SIZE] for i in range(0, len(tile), HASH_SIZE)]
+
+
+def split_entries(tile):
+    values = []
+
+    while tile:
+        length, = ENTRY_LENGTH.unpack_from(tile)
+        start = ENTRY_LENGTH.size
+        values.append(tile[start:start + length])
+        tile = tile[start + length:]
+
+    return values
+
+
+class TestTilePath(unittest.TestCase):
+    def test_tile_path(self):
+        for level, index, expected in [
+            (0, 0, 'tile/0/000'),
+            (0, 7, 'tile/0/007'),
+            (1, 999, 'tile/1/999'),
+            (0, 1000, 'tile/0/x001/000'),
+            (0, 1234067, 'tile/0/x001/x234/067'),
+            ('entries', 23456, 'tile/entries/x023/456'),
+        ]:
+            self.assertEqual(
+                tile_path(level, index), pjoin(*expected.split('/'))
+            )
+
+
+class TestTileWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.writer = TileWriter(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_tile(self, level, index):
+        path = pjoin(
+            self.writer.log_directory(LOG_ID), tile_path(level, index)
+        )
+
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def tile_exists(self, level, index):
+        return os.path.exists(pjoin(
+            self.writer.log_directory(LOG_ID), tile_path(level, index)
+        ))
+
+    def test_only_full_tiles_are_written(self):
+        self.writer.append(LOG_ID, make_leaves(0, TILE_WIDTH - 1))
+
+        self.assertEqual(self.writer.size(LOG_ID), TILE_WIDTH - 1)
+        self.assertFalse(self.tile_exists(0, 0))
+        self.assertFalse(self.tile_exists('entries', 0))
+
+        self.writer.append(LOG_ID, make_leaves(TILE_WIDTH - 1, TILE_WIDTH + 1))
+
+        self.assertEqual(self.writer.size(LOG_ID), TILE_WIDTH + 1)
+        self.assertTrue(self.tile_exists(0, 0))
+        self.assertFalse(self.tile_exists(0, 1))
+
+    def test_tile_contents(self):
+        leaves = make_leaves(0, 2 * TILE_WIDTH)
+        self.writer.append(LOG_ID, leaves)
+
+        for index in range(2):
+            tile_leaves = leaves[index * TILE_WIDTH:(index + 1) * TILE_WIDTH]
+
+            self.assertEqual(
+                split_entries(self.read_tile('entries', index)),
+                [leaf.leaf_value for leaf in tile_leaves]
+            )
+            self.assertEqual(
+                split_hashes(self.read_tile(0, index)),
+                [leaf.merkle_leaf_hash for leaf in tile_leaves]
+            )
+
+    def test_higher_levels(self):
+        """
+        Reopens the writer part way through, so the level 1 tile is finished
+        from hashes rebuilt from the level 0 tiles.
+        """
+        tree_size = TILE_WIDTH * TILE_WIDTH
+        leaves = make_leaves(0, tree_size)
+        hashes = [leaf.merkle_leaf_hash for leaf in leaves]
+
+        self.writer.append(LOG_ID, leaves[:3 * TILE_WIDTH + 10])
+
+        writer = TileWriter(self.directory.name)
+        self.assertEqual(writer.size(LOG_ID), 3 * TILE_WIDTH)
+        writer.append(LOG_ID, leaves[3 * TILE_WIDTH:])
+
+        self.assertEqual(
+            split_hashes(self.read_tile(1, 0)),
+            [
+                merkle.root_from_leaf_hashes(hashes[i:i + TILE_WIDTH])
+                for i in range(0, tree_size, TILE_WIDTH)
+            ]
+        )
+        self.assertEqual(
+            merkle.root_from_leaf_hashes(split_hashes(self.read_tile(1, 0))),
+            merkle.root_from_leaf_hashes(hashes)
+        )
+        self.assertFalse(self.tile_exists(2, 0))
+
+    def test_reopen_before_size_saved(self):
+        """
+        Tiles written by a writer which crashed before saving its size are
+        written again, the same, when the leaves are fed again.
+        """
+        leaves = make_leaves(0, 2 * TILE_WIDTH)
+        self.writer.append(LOG_ID, leaves)
+        tiles = [self.read_tile(0, 1), self.read_tile('entries', 1)]
+
+        size_path = pjoin(self.writer.log_directory(LOG_ID), 'size')
+
+        with open(size_path, 'w') as f:
+            f.write(str(TILE_WIDTH))
+
+        writer = TileWriter(self.directory.name)
+        self.assertEqual(writer.size(LOG_ID), TILE_WIDTH)
+
+        writer.append(LOG_ID, leaves[TILE_WIDTH:])
+        self.assertEqual(writer.size(LOG_ID), 2 * TILE_WIDTH)
+        self.assertEqual(
+            [self.read_tile(0, 1), self.read_tile('entries', 1)], tiles
+        )
+
+    def test_append_out_of_order(self):
+        self.writer.append(LOG_ID, make_leaves(0, 3))
+
+        with self.assertRaises(ValueError):
+            self.writer.append(LOG_ID, make_leaves(4, 5))
+
+        self.assertEqual(self.writer.size(LOG_ID), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
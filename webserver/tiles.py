@@ -0,0 +1,197 @@
+import os
+import struct
+import threading
+
+from os.path import join as pjoin
+
+import merkle
+
+from merkle import HASH_SIZE
+
+
+TILE_WIDTH = 256
+
+# Each entry in a data tile is preceded by its length.
+ENTRY_LENGTH = struct.Struct('>I')
+
+
+def tile_path(level, index):
+    """
+    The path of a tile, relative to a log's tile directory, as in tlog tiles:
+    the index is split into groups of three digits, all but the last prefixed
+    with 'x', eg tile 1234067 of level 0 is `tile/0/x001/x234/067`. Data tiles
+    use `entries` as their level.
+    """
+    digits = '{:03d}'.format(index)
+    digits = '0' * (-len(digits) % 3) + digits
+    groups = [digits[i:i + 3] for i in range(0, len(digits), 3)]
+
+    return pjoin(
+        'tile', str(level), *(['x' + g for g in groups[:-1]] + groups[-1:])
+    )
+
+
+class TileWriter():
+    """
+    Writes each log's leaves out as static, immutable tiles of TILE_WIDTH
+    entries, under `directory/<log_id>/`, so they can be served by any file
+    server or CDN. Used as a LeafMirror follower.
+
+    * `tile/entries/N` holds the leaf values of leaves [256N, 256N + 256)
+    * `tile/0/N` holds the leaf hashes of the same leaves
+    * `tile/L/N` holds 256 hashes of level L: the roots of consecutive tiles
+      of level L - 1
+
+    Only full tiles are written. Leaves after the last full tile are kept in
+    memory and are fed again from the mirror after a restart.
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__logs = {}
+        self.__lock = threading.Lock()
+
+    def log_directory(self, log_id):
+        return pjoin(self.__directory, str(log_id))
+
+    def __log(self, log_id):
+        with self.__lock:
+            if log_id not in self.__logs:
+                self.__logs[log_id] = _LogTiles(self.log_directory(log_id))
+
+            return self.__logs[log_id]
+
+    def size(self, log_id):
+        return self.__log(log_id).size
+
+    def append(self, log_id, leaves):
+        self.__log(log_id).append(leaves)
+
+
+class _LogTiles():
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+
+        self.__directory = directory
+        self.__size_path = pjoin(directory, 'size')
+        self.__tiled_size = self.__load_size()
+        self.__values = []
+        self.__levels = []  # hashes waiting for a full tile, per level
+        self.__tile_counts = []  # full tiles written, per level
+        self.__lock = threading.Lock()
+
+        self.__load_partial_levels()
+
+    def __load_size(self):
+        try:
+            with open(self.__size_path) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            return 0
+
+    def __load_partial_levels(self):
+        """
+        Rebuilds the hashes of each level above 0 which aren't in a full tile
+        yet, from the full tiles of the level below.
+        """
+        level = 0
+        tiles = self.__tiled_size // TILE_WIDTH
+        self.__levels.append([])
+
+        while tiles:
+            full_parents = tiles // TILE_WIDTH
+            self.__tile_counts.append(tiles)
+            self.__levels.append([
+                merkle.root_from_leaf_hashes(
+                    self.__read_hashes(level, index)
+                ) for index in range(full_parents * TILE_WIDTH, tiles)
+            ])
+
+            level += 1
+            tiles = full_parents
+
+        self.__tile_counts.append(0)
+
+    def __read_hashes(self, level, index):
+        with open(pjoin(self.__directory, tile_path(level, index)), 'rb') as f:
+            tile = f.read()
+
+        return [tile[i:i + HASH_SIZE] for i in range(0, len(tile), HASH_SIZE)]
+
+    @property
+    def size(self):
+        return self.__tiled_size + len(self.__values)
+
+    def append(self, leaves):
+        with self.__lock:
+            for expected, leaf in enumerate(leaves, self.size):
+                if leaf.leaf_index != expected:
+                    raise ValueError(
+                        'Expected leaf {}, got {}'.format(
+                            expected, leaf.leaf_index)
+                    )
+
+            saved_size = self.__tiled_size
+
+            for leaf in leaves:
+                self.__values.append(leaf.leaf_value)
+                self.__levels[0].append(leaf.merkle_leaf_hash)
+
+                if len(self.__values) == TILE_WIDTH:
+                    self.__write_entries(self.__tile_counts[0])
+                    self.__write_hashes(0)
+                    self.__tiled_size += TILE_WIDTH
+
+            if self.__tiled_size != saved_size:
+                # Tiles are written before the size which covers them, so
+                # after a crash they're just written again.
+                self.__write(
+                    self.__size_path, str(self.__tiled_size).encode()
+                )
+
+    def __write_entries(self, index):
+        self.__write(
+            pjoin(self.__directory, tile_path('entries', index)),
+            b''.join(
+                ENTRY_LENGTH.pack(len(value)) + value
+                for value in self.__values
+            )
+        )
+        self.__values = []
+
+    def __write_hashes(self, level):
+        """
+        Writes the full tile of hashes waiting at `level`, then passes its
+        root up to the next level.
+        """
+        hashes = self.__levels[level]
+        index = self.__tile_counts[level]
+
+        self.__write(
+            pjoin(self.__directory, tile_path(level, index)), b''.join(hashes)
+        )
+        self.__levels[level] = []
+        self.__tile_counts[level] += 1
+
+        if level + 1 == len(self.__levels):
+            self.__levels.append([])
+            self.__tile_counts.append(0)
+
+        self.__levels[level + 1].append(merkle.root_from_leaf_hashes(hashes))
+
+        if len(self.__levels[level + 1]) == TILE_WIDTH:
+            self.__write_hashes(level + 1)
+
+    @staticmethod
+    def __write(path, data):
+        """
+        Writes a file under a temporary name and renames it into place, so
+        readers never see part of a tile.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = path + '.tmp'
+
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+
+        os.replace(temporary_path, path)
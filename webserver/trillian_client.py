@@ -1,28 +1,40 @@
 import base64
-import grpc
+import hashlib
+import logging
 
 from collections import OrderedDict
 
 import trillian_log_api_pb2
-import trillian_log_api_pb2_grpc
 import trillian_admin_api_pb2
-import trillian_admin_api_pb2_grpc
 import trillian_pb2
 import crypto.sigpb.sigpb_pb2
 import google.protobuf.duration_pb2
 import crypto.keyspb.keyspb_pb2
 
 
+LOG = logging.getLogger(__name__)
+
+
+def leaf_identity_hash(leaf_value):
+    """
+    Trillian treats leaves with the same identity hash as duplicates. Ours is
+    the SHA-256 of the leaf value, so identical submissions are only logged
+    once.
+    """
+    return hashlib.sha256(leaf_value).digest()
+
+
 class TrillianAdminClient():
     """
     Calls the gRPC endpoints defined in:
     https://github.com/google/trillian/blob/master/trillian_admin_api.proto
     """
 
-    def __init__(self, host, port):
-        self.__channel = grpc.insecure_channel('{}:{}'.format(host, port))
-        self.__stub = trillian_admin_api_pb2_grpc.TrillianAdminStub(
-            self.__channel)
+    def __init__(self, backend_pool):
+        self.__pool = backend_pool
+
+    def __call(self, method_name, request):
+        return self.__pool.call('admin_stub', method_name, request)
 
     def logs(self):
         """
@@ -36,12 +48,12 @@ class TrillianAdminClient():
 
         # TODO: filter out maps
 
-        return self.__stub.ListTrees(request).tree
+        return self.__call('ListTrees', request).tree
 
     def get_public_key(self, log_id):
         request = trillian_admin_api_pb2.GetTreeRequest(tree_id=log_id)
 
-        return self.__stub.GetTree(request)
+        return self.__call('GetTree', request)
 
     def create_log(self, display_name, description):
         request = trillian_admin_api_pb2.CreateTreeRequest(
@@ -67,51 +79,68 @@ class TrillianAdminClient():
             )
         )
 
-        return self.__stub.CreateTree(request)
+        return self.__call('CreateTree', request)
 
     def delete_log(self, log_id):
         request = trillian_admin_api_pb2.DeleteTreeRequest(
             tree_id=log_id
         )
 
-        return self.__stub.DeleteTree(request)
+        return self.__call('DeleteTree', request)
 
     def get_log(self, log_id):
         request = trillian_admin_api_pb2.GetTreeRequest(
             tree_id=log_id
         )
 
-        return self.__stub.GetTree(request)
+        return self.__call('GetTree', request)
 
 
 class TrillianLogClient():
     MAX_LEAVES_PER_REQUEST = 1024
 
-    def __init__(self, host, port, log_id):
-        self.__channel = grpc.insecure_channel('{}:{}'.format(host, port))
-        self.__stub = trillian_log_api_pb2_grpc.TrillianLogStub(self.__channel)
+    def __init__(self, backend_pool, log_id, charge_to=()):
+        """
+        `charge_to` names the users that Trillian should charge requests to
+        for its quotas.
+        """
+        self.__pool = backend_pool
         self.__log_id = log_id
+        self.__charge_to = trillian_log_api_pb2.ChargeTo(user=charge_to)
+
+    def __call(self, method_name, request):
+        return self.__pool.call('log_stub', method_name, request)
+
+    def __read(self, method_name, request):
+        """
+        Like `__call`, but for RPCs that are safe to send twice, so a slow one
+        may be hedged to a second backend.
+        """
+        return self.__pool.call('log_stub', method_name, request, read=True)
 
     def init_log(self):
         request = trillian_log_api_pb2.InitLogRequest(
             log_id=self.__log_id,
-            charge_to=trillian_log_api_pb2.ChargeTo()
+            charge_to=self.__charge_to,
         )
 
-        return self.__stub.InitLog(request)
+        return self.__call('InitLog', request)
 
     def queue_entry_base64(self, base64_data):
-        binary_data = base64.b64decode(base64_data)
+        return self.queue_entry(base64.b64decode(base64_data))
 
+    def queue_entry(self, leaf_value):
         leaf = trillian_log_api_pb2.LogLeaf(
-            leaf_value=binary_data
+            leaf_value=leaf_value,
+            leaf_identity_hash=leaf_identity_hash(leaf_value),
         )
 
         request = trillian_log_api_pb2.QueueLeafRequest(
             log_id=self.__log_id,
-            leaf=leaf
+            leaf=leaf,
+            charge_to=self.__charge_to,
         )
-        return self.__stub.QueueLeaf(request)
+        return self.__call('QueueLeaf', request)
 
     def get_recent_leaves(self, number_of_leaves):
         tree_size = self.get_tree_size()
@@ -122,18 +151,7 @@ class TrillianLogClient():
             -1
         ))
 
-        if not indexes:
-            return []
-
-        print("Requesting indexes {}".format(indexes))
-
-        request = trillian_log_api_pb2.GetLeavesByIndexRequest(
-            log_id=self.__log_id,
-        )
-        request.leaf_index.extend(indexes)
-
-        response = self.__stub.GetLeavesByIndex(request)
-        return response.leaves
+        return self.get_leaves_by_index(indexes)
 
     def get_leaves(self, start, end):
         if not isinstance(start, int) or not isinstance(end, int):
@@ -160,22 +178,47 @@ class TrillianLogClient():
             range(start, min(end, tree_size))
         )
 
+        return sorted(
+            self.get_leaves_by_index(indexes),
+            key=lambda l: l.leaf_index
+        )
+
+    def get_leaves_by_index(self, indexes):
+        """
+        Fetches leaves which are known to be sequenced, without first checking
+        the tree size.
+        """
         if not indexes:
             return []
 
-        print("Requesting indexes {}".format(indexes))
+        LOG.debug(
+            'Requesting %d leaves of log %s from index %d',
+            len(indexes), self.__log_id, indexes[0]
+        )
 
         request = trillian_log_api_pb2.GetLeavesByIndexRequest(
             log_id=self.__log_id,
+            charge_to=self.__charge_to,
         )
         request.leaf_index.extend(indexes)
 
-        response = self.__stub.GetLeavesByIndex(request)
+        response = self.__read('GetLeavesByIndex', request)
+        return response.leaves
 
-        return sorted(
-            response.leaves,
-            key=lambda l: l.leaf_index
+    def get_leaves_by_hash(self, leaf_hashes):
+        """
+        Fetches the sequenced leaves with any of the given merkle_leaf_hash
+        values, in index order.
+        """
+        request = trillian_log_api_pb2.GetLeavesByHashRequest(
+            log_id=self.__log_id,
+            order_by_sequence=True,
+            charge_to=self.__charge_to,
         )
+        request.leaf_hash.extend(leaf_hashes)
+
+        response = self.__read('GetLeavesByHash', request)
+        return response.leaves
 
     def get_leaves_by_range(self, start_index, count):
         return self.get_leaves(start_index, start_index + count)
@@ -191,17 +234,62 @@ class TrillianLogClient():
             log_id=self.__log_id,
             first_tree_size=first_tree_size,
             second_tree_size=second_tree_size,
+            charge_to=self.__charge_to,
         )
-        response = self.__stub.GetConsistencyProof(request)
+        response = self.__read('GetConsistencyProof', request)
         return response
 
+    def get_inclusion_proof(self, leaf_index, tree_size):
+        if leaf_index < 0:
+            raise ValueError('`leaf_index` must be >= 0')
+
+        if leaf_index >= tree_size:
+            raise ValueError('`leaf_index` must be < `tree_size`')
+
+        request = trillian_log_api_pb2.GetInclusionProofRequest(
+            log_id=self.__log_id,
+            leaf_index=leaf_index,
+            tree_size=tree_size,
+            charge_to=self.__charge_to,
+        )
+        return self.__read('GetInclusionProof', request)
+
+    def get_inclusion_proof_by_hash(self, leaf_hash, tree_size):
+        if tree_size <= 0:
+            raise ValueError('`tree_size` must be > 0')
+
+        request = trillian_log_api_pb2.GetInclusionProofByHashRequest(
+            log_id=self.__log_id,
+            leaf_hash=leaf_hash,
+            tree_size=tree_size,
+            order_by_sequence=True,
+            charge_to=self.__charge_to,
+        )
+        return self.__read('GetInclusionProofByHash', request)
+
+    def get_entry_and_proof(self, leaf_index, tree_size):
+        if leaf_index < 0:
+            raise ValueError('`leaf_index` must be >= 0')
+
+        if leaf_index >= tree_size:
+            raise ValueError('`leaf_index` must be < `tree_size`')
+
+        request = trillian_log_api_pb2.GetEntryAndProofRequest(
+            log_id=self.__log_id,
+            leaf_index=leaf_index,
+            tree_size=tree_size,
+            charge_to=self.__charge_to,
+        )
+        return self.__read('GetEntryAndProof', request)
+
     def get_tree_size(self):
         return self.get_signed_log_root().tree_size
 
     def get_signed_log_root(self):
         request = trillian_log_api_pb2.GetLatestSignedLogRootRequest(
             log_id=self.__log_id,
+            charge_to=self.__charge_to,
         )
 
-        response = self.__stub.GetLatestSignedLogRoot(request)
+        response = self.__read('GetLatestSignedLogRoot', request)
         return response.signed_log_root